@@ -1,11 +1,32 @@
 import streamlit as st
-import asyncio
-from database import GestaltViewDB
-from tribunal import TribunalService
+from context import ConversationContext
+from metrics import DB_LATENCY, PERSONA_LATENCY, PERSONA_TOKENS, PERSONA_TTFT, REGISTRY, RERUN_LATENCY
+from providers import LazyProvider, Usage
+from resources import (get_database, get_tribunal_service, get_write_queue, invalidate_resources, resource_stats,
+                       start_metrics_server)
+from runner import get_background_loop
+from tribunal import UNAVAILABLE_NOTICE, PersonaResponse
+from writebehind import WriteBehindQueue
+import hmac
+import html
+import os
 import time
 import uuid
 from datetime import datetime
 
+# Upper bound on how long a session waits for a whole tribunal (or, when streaming, for the next chunk)
+TRIBUNAL_TIMEOUT = 90.0
+# Personas still answering after this many seconds are shown as pending and collected later
+TRIBUNAL_DEADLINE = 20.0
+# Minimum seconds between re-renders of a streaming persona card
+STREAM_RENDER_INTERVAL = 0.05
+# Messages rendered per page of the chat transcript
+TRANSCRIPT_PAGE_SIZE = 24
+# Tribunals fetched per page in the sidebar history
+HISTORY_PAGE_SIZE = 10
+# Unlocks process-wide controls (resetting shared connections) for sessions opened with ?admin=<token>
+ADMIN_TOKEN = os.getenv("GESTALTVIEW_ADMIN_TOKEN", "")
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="GestaltView Consciousness Tribunal",
@@ -78,10 +99,15 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def message_text(content: str) -> str:
+    """Message text as inline HTML; line breaks become <br> so a blank line can't end the markdown HTML block"""
+    return html.escape(content).replace("\r\n", "\n").replace("\n", "<br>")
+
 class TribunalPortalApp:
     def __init__(self):
-        self.db = GestaltViewDB()
-        self.tribunal = TribunalService()
+        self.db = get_database()
+        self.tribunal = get_tribunal_service()
+        start_metrics_server()
         
         # Initialize session state
         if 'user_id' not in st.session_state:
@@ -94,7 +120,32 @@ class TribunalPortalApp:
             st.session_state.messages = []
         if 'user_tier' not in st.session_state:
             st.session_state.user_tier = "basic"
+        if 'stream_responses' not in st.session_state:
+            st.session_state.stream_responses = True
+        if 'conversation' not in st.session_state:
+            st.session_state.conversation = ConversationContext()
+        if 'transcript_window' not in st.session_state:
+            st.session_state.transcript_window = TRANSCRIPT_PAGE_SIZE
+        if 'message_html' not in st.session_state:
+            st.session_state.message_html = {}  # message id -> rendered HTML fragment
+        if 'history' not in st.session_state:
+            st.session_state.history = None  # (loaded rows, next cursor); None means reload
+        if 'pending_tribunal' not in st.session_state:
+            st.session_state.pending_tribunal = None  # tribunal with personas that missed the deadline
     
+    @property
+    def writes(self) -> WriteBehindQueue:
+        """Tribunal saves and history reads go through the write-behind queue.
+
+        Looked up at each use, so a save finishing after a reset goes to the new queue, not the closed one.
+        """
+        return get_write_queue()
+
+    @property
+    def is_admin(self) -> bool:
+        """Whether this session may use process-wide controls: ?admin=<GESTALTVIEW_ADMIN_TOKEN> in the URL"""
+        return bool(ADMIN_TOKEN) and hmac.compare_digest(st.query_params.get("admin", ""), ADMIN_TOKEN)
+
     def render_floating_embers(self):
         """Render floating consciousness embers"""
         ember_html = ""
@@ -205,24 +256,9 @@ class TribunalPortalApp:
         # Chat interface
         st.markdown("### 💬 Consciousness Synthesis")
         
-        # Display messages
-        for message in st.session_state.messages:
-            if message['type'] == 'user':
-                st.markdown(f"""
-                <div style="text-align: right; margin: 15px 0;">
-                    <div style="display: inline-block; background: linear-gradient(45deg, #10B981, #06B6D4); 
-                                padding: 15px; border-radius: 15px; max-width: 80%; color: white;">
-                        <strong>You:</strong> {message['content']}
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="tribunal-response">
-                    <strong style="color: #10B981;">{message.get('persona', 'Tribunal')}:</strong><br>
-                    {message['content']}
-                </div>
-                """, unsafe_allow_html=True)
+        # Display the most recent messages; older ones load on demand
+        self.render_transcript()
+        self.render_pending()
         
         # Input form
         with st.form("consciousness_query", clear_on_submit=True):
@@ -232,46 +268,255 @@ class TribunalPortalApp:
             if submitted and user_input.strip():
                 # Add user message
                 st.session_state.messages.append({
+                    'id': str(uuid.uuid4()),
                     'type': 'user',
                     'content': user_input,
                     'timestamp': datetime.now().isoformat()
                 })
+                st.session_state.transcript_window = TRANSCRIPT_PAGE_SIZE
                 
                 # Process with tribunal
                 with st.spinner("🔮 Consciousness synthesis in progress..."):
-                    # Create tribunal session
-                    session_id = self.db.create_tribunal_session(st.session_state.user_id, user_input)
-                    
-                    # Query tribunal (simplified synchronous version for demo)
+                    # Query the tribunal on the shared background loop; only this session's
+                    # script thread waits, other sessions keep running their own tribunals
                     try:
-                        # Simulate tribunal response for demo
-                        import random
-                        responses = {}
-                        for persona in selected_personas:
-                            responses[persona.provider] = f"From {persona.name}: Your consciousness query reveals profound patterns. As {persona.role}, I see that your {persona.specialty.lower()} suggests transformative potential. {persona.perspective}"
+                        # Bounded recent turns plus a rolling summary, instead of the whole transcript
+                        context = st.session_state.conversation.render()
+                        if st.session_state.stream_responses:
+                            result = self.stream_tribunal(selected_personas, user_input, context)
+                        else:
+                            result = get_background_loop().run(
+                                self.tribunal.summon_tribunal(st.session_state.selected_personas, user_input, context,
+                                                              deadline=TRIBUNAL_DEADLINE),
+                                timeout=TRIBUNAL_TIMEOUT
+                            )
+                        names = {persona.id: persona.name for persona in selected_personas}
                         
                         # Add AI responses
-                        for provider, response in responses.items():
+                        self.append_responses(result['results'])
+                        # Personas whose provider circuit is open were not queried at all
+                        for name in result.get('skipped', []):
                             st.session_state.messages.append({
+                                'id': str(uuid.uuid4()),
                                 'type': 'ai',
-                                'content': response,
-                                'persona': provider,
+                                'content': f"{UNAVAILABLE_NOTICE}: {name} is paused while its provider recovers",
+                                'persona': name,
                                 'timestamp': datetime.now().isoformat()
                             })
                         
-                        # Save to database
-                        self.db.save_tribunal_response(session_id, {
-                            **responses,
-                            'consensus_score': random.uniform(0.8, 0.95),
-                            'empowerment_consensus': random.uniform(0.85, 0.95),
-                            'revolutionary_potential': random.uniform(0.75, 0.95)
+                        st.session_state.conversation.add_turn(user_input, {
+                            names[response.persona_id]: response.text
+                            for response in result['results'] if response.text and not response.error
                         })
                         
+                        # Queue the session and every persona response; they are committed in the background
+                        session_id = self.writes.save_tribunal(st.session_state.user_id, user_input, result)
+                        st.session_state.history = None
+                        st.session_state.pending_tribunal = {
+                            'session_id': session_id, 'query': user_input, 'context': context, 'tribunal': result
+                        } if result.get('pending') else None
+                        
                     except Exception as e:
                         st.error(f"Consciousness synthesis temporarily unavailable: {str(e)}")
                 
                 st.rerun()
     
+    def append_responses(self, results):
+        """Add answered personas to the transcript; pending ones are added once they are collected"""
+        names = {persona.id: persona.name for persona in self.tribunal.personas}
+        for response in results:
+            if response.text is None:
+                continue
+            st.session_state.messages.append({
+                'id': str(uuid.uuid4()),
+                'type': 'ai',
+                'content': response.text,
+                'persona': names[response.persona_id],
+                'timestamp': datetime.now().isoformat()
+            })
+    
+    def render_pending(self):
+        """Offer to collect the personas that missed the tribunal deadline"""
+        pending = st.session_state.pending_tribunal
+        if pending is None:
+            return
+        names = {persona.id: persona.name for persona in self.tribunal.personas}
+        waiting = ", ".join(names[persona_id] for persona_id in pending['tribunal']['pending'])
+        st.info(f"⏳ Still deliberating: {waiting}")
+        if st.button("Collect late answers", use_container_width=True):
+            before = {r.persona_id for r in pending['tribunal']['results'] if r.pending}
+            tribunal = get_background_loop().run(
+                self.tribunal.complete_pending(pending['tribunal'], pending['query'], pending['context'],
+                                               deadline=TRIBUNAL_DEADLINE),
+                timeout=TRIBUNAL_TIMEOUT
+            )
+            self.append_responses(r for r in tribunal['results'] if r.persona_id in before and not r.pending)
+            self.writes.save_tribunal_response(pending['session_id'], tribunal)
+            st.session_state.pending_tribunal = {**pending, 'tribunal': tribunal} if tribunal['pending'] else None
+            st.rerun()
+    
+    def render_transcript(self):
+        """Render only the newest messages as one block, reusing each message's cached HTML"""
+        messages = st.session_state.messages
+        hidden = max(0, len(messages) - st.session_state.transcript_window)
+        if hidden and st.button(f"⬆️ Show earlier messages ({hidden} hidden)", use_container_width=True):
+            st.session_state.transcript_window += TRANSCRIPT_PAGE_SIZE
+            st.rerun()
+        
+        cached = st.session_state.message_html
+        fragments = {}
+        for message in messages[hidden:]:
+            if 'id' not in message:
+                message['id'] = str(uuid.uuid4())
+            fragments[message['id']] = cached.get(message['id']) or self.message_html(message)
+        # Only the visible window stays cached, so memory is bounded like the payload
+        st.session_state.message_html = fragments
+        
+        if fragments:
+            st.markdown("\n".join(fragments.values()), unsafe_allow_html=True)
+    
+    def message_html(self, message) -> str:
+        """Render one transcript message as a self-contained HTML fragment"""
+        if message['type'] == 'user':
+            return ('<div style="text-align: right; margin: 15px 0;">'
+                    '<div style="display: inline-block; background: linear-gradient(45deg, #10B981, #06B6D4); '
+                    'padding: 15px; border-radius: 15px; max-width: 80%; color: white;">'
+                    f'<strong>You:</strong> {message_text(message["content"])}'
+                    '</div></div>')
+        return self.tribunal_response_html(message.get('persona', 'Tribunal'), message['content'])
+    
+    def tribunal_response_html(self, persona_label: str, content: str) -> str:
+        """Render a persona's answer as a tribunal-response card"""
+        return (f'<div class="tribunal-response"><strong style="color: #10B981;">{persona_label}:</strong><br>'
+                f'{message_text(content)}</div>')
+    
+    def stream_tribunal(self, selected_personas, user_input: str, context: str = ""):
+        """Stream every persona's answer into its own card as the deltas arrive"""
+        # One split of the selection, shared with the service, so every streamed persona has a card
+        selected_personas, skipped = self.tribunal.split_personas([persona.id for persona in selected_personas])
+        placeholders = {persona.id: st.empty() for persona in selected_personas}
+        texts = {persona.id: "" for persona in selected_personas}
+        names = {persona.id: persona.name for persona in selected_personas}
+        last_render = {persona.id: 0.0 for persona in selected_personas}
+        latencies = {persona.id: 0.0 for persona in selected_personas}
+        tokens = {persona.id: 0 for persona in selected_personas}
+        pending = {}
+        
+        start = time.perf_counter()
+        chunks = self.tribunal.stream_tribunal([persona.id for persona in selected_personas], user_input, context,
+                                               active_personas=selected_personas, deadline=TRIBUNAL_DEADLINE)
+        for persona_id, delta in get_background_loop().iterate(chunks, timeout=TRIBUNAL_TIMEOUT):
+            if isinstance(delta, Usage):
+                tokens[persona_id] = delta.tokens
+                continue
+            if isinstance(delta, PersonaResponse):
+                pending[persona_id] = delta
+                continue
+            texts[persona_id] += delta
+            # Throttle re-renders so fast token streams don't flood the websocket
+            now = time.perf_counter()
+            latencies[persona_id] = (now - start) * 1000
+            if now - last_render[persona_id] >= STREAM_RENDER_INTERVAL:
+                placeholders[persona_id].markdown(self.tribunal_response_html(names[persona_id], texts[persona_id] + " ▌"),
+                                                  unsafe_allow_html=True)
+                last_render[persona_id] = now
+        
+        for persona in selected_personas:
+            placeholders[persona.id].markdown(self.tribunal_response_html(
+                persona.name, texts[persona.id] + (" ⏳" if persona.id in pending else "")), unsafe_allow_html=True)
+        
+        # A persona past the deadline is pending even if part of its answer streamed in
+        results = [
+            pending.get(persona.id) or
+            PersonaResponse(persona.id, persona.provider, texts[persona.id], latencies[persona.id], tokens[persona.id],
+                            error=UNAVAILABLE_NOTICE in texts[persona.id])
+            for persona in selected_personas if texts[persona.id] or persona.id in pending
+        ]
+        return {
+            'responses': {result.persona_id: result.text for result in results if not result.pending},
+            'results': results,
+            'personas': [p.name for p in selected_personas],
+            'skipped': [persona.name for persona in skipped],
+            'pending': list(pending),
+            **self.tribunal.consensus_metrics(selected_personas, results)
+        }
+    
+    def render_history(self):
+        """Render the user's past tribunals one keyset page at a time, or full-text matches when searching"""
+        search = st.text_input("Search tribunals and drops", key="history_search", placeholder="e.g. rhythm chaos")
+        if search.strip():
+            matches = self.db.search_history(st.session_state.user_id, search, limit=HISTORY_PAGE_SIZE)
+            if not matches:
+                st.caption("No matches")
+            for match in matches:
+                text = match['text'] if len(match['text']) <= 60 else match['text'][:57] + "..."
+                icon = "💧" if match['source'] == "bucket_drops" else "⚖️"
+                st.markdown(f"{icon} **{match['created_at'][:16]}** · {text}")
+            return
+        
+        if st.session_state.history is None:
+            st.session_state.history = self.writes.get_session_history(st.session_state.user_id, limit=HISTORY_PAGE_SIZE)
+        rows, cursor = st.session_state.history
+        
+        if not rows:
+            st.caption("No tribunals yet")
+        for row in rows:
+            query = row['query_text'] if len(row['query_text']) <= 60 else row['query_text'][:57] + "..."
+            st.markdown(f"**{row['created_at'][:16]}** · {query}")
+        
+        if cursor is not None and st.button("Load older tribunals", use_container_width=True):
+            page, next_cursor = self.writes.get_session_history(st.session_state.user_id, limit=HISTORY_PAGE_SIZE,
+                                                                cursor=cursor)
+            st.session_state.history = (rows + page, next_cursor)
+            st.rerun()
+    
+    def render_instrumentation(self):
+        """Admin view of the process-wide metrics, with a Prometheus export"""
+        rerun = RERUN_LATENCY.labels()
+        st.markdown(f"**Reruns** · {rerun.count} · last {rerun.last * 1000:.0f} ms · "
+                    f"p50 {rerun.quantile(0.5) * 1000:.0f} ms · p95 {rerun.quantile(0.95) * 1000:.0f} ms")
+        writes = self.writes.stats
+        st.markdown(f"**Write-behind** · {self.writes.depth} queued · {writes.written} written in "
+                    f"{writes.batches} batches ({writes.mean_batch:.1f}/batch) · {writes.retries} retries · "
+                    f"{writes.dropped} dropped · peak {writes.max_depth}")
+        if writes.last_error:
+            st.caption(f"Last dropped save · {writes.last_error}")
+        
+        ttft = {labels['persona']: histogram for labels, histogram in PERSONA_TTFT.children()}
+        tokens = {}
+        for labels, counter in PERSONA_TOKENS.children():
+            tokens.setdefault(labels['persona'], {})[labels['kind']] = counter.value
+        st.markdown("**Personas**")
+        st.dataframe([
+            {
+                "persona": labels['persona'],
+                "outcome": labels['outcome'],
+                "calls": histogram.count,
+                "p50 ms": round(histogram.quantile(0.5) * 1000),
+                "p95 ms": round(histogram.quantile(0.95) * 1000),
+                "TTFT p50 ms": round(ttft[labels['persona']].quantile(0.5) * 1000) if labels['persona'] in ttft else None,
+                "prompt tokens": int(tokens.get(labels['persona'], {}).get("prompt", 0)),
+                "completion tokens": int(tokens.get(labels['persona'], {}).get("completion", 0)),
+            }
+            for labels, histogram in sorted(PERSONA_LATENCY.children(), key=lambda child: sorted(child[0].items()))
+        ], hide_index=True, use_container_width=True)
+        
+        st.markdown("**Database**")
+        st.dataframe([
+            {
+                "method": labels['method'],
+                "calls": histogram.count,
+                "mean ms": round(histogram.mean * 1000, 2),
+                "p95 ms": round(histogram.quantile(0.95) * 1000, 2),
+                "total s": round(histogram.sum, 3),
+            }
+            for labels, histogram in sorted(DB_LATENCY.children(), key=lambda child: -child[1].sum)
+            if histogram.count
+        ], hide_index=True, use_container_width=True)
+        
+        st.download_button("Export Prometheus metrics", REGISTRY.render(), file_name="gestaltview.prom",
+                           mime="text/plain", use_container_width=True)
+    
     def run(self):
         """Run the Streamlit app"""
         self.render_floating_embers()
@@ -285,10 +530,45 @@ class TribunalPortalApp:
                 ["basic", "premium", "enterprise"],
                 index=["basic", "premium", "enterprise"].index(st.session_state.user_tier)
             )
+            st.session_state.stream_responses = st.toggle("Stream responses", value=st.session_state.stream_responses)
             
             st.markdown("### 📊 Session Stats")
             st.metric("Active Personas", len(st.session_state.selected_personas))
             st.metric("Messages", len(st.session_state.messages))
+            st.metric("Context Tokens", st.session_state.conversation.tokens)
+            
+            with st.expander("📜 Tribunal History"):
+                self.render_history()
+            
+            with st.expander("♻️ Cached Resources"):
+                for stats in resource_stats().values():
+                    st.markdown(f"**{stats.name}** · built {stats.builds}× · reused {stats.hits}×  \n"
+                                f"build {stats.build_seconds * 1000:.1f} ms, {stats.build_blocks:,} allocations  \n"
+                                f"saved {stats.saved_seconds * 1000:.0f} ms, {stats.saved_blocks:,} allocations")
+                if self.tribunal.cache is not None:
+                    for tier, stats in self.tribunal.cache.stats():
+                        st.markdown(f"**{tier} response cache** · {stats.hits} hits · {stats.misses} misses "
+                                    f"({stats.hit_rate:.0%}) · {stats.evictions} evicted")
+                st.markdown(f"**Coalesced requests** · {self.tribunal.flights.total_coalesced} callers shared an "
+                            f"in-flight provider call")
+                if self.is_admin and st.button("Reset connections", use_container_width=True):
+                    invalidate_resources()
+                    st.rerun()
+            
+            with st.expander("🛡️ Provider Health"):
+                for provider, state in self.tribunal.breaker_states().items():
+                    guard = self.tribunal.guards[provider]
+                    adapter = self.tribunal.providers[provider]
+                    loaded = ""
+                    if isinstance(adapter, LazyProvider):
+                        loaded = (f" · client loaded in {adapter.build_seconds * 1000:.0f} ms" if adapter.built
+                                  else " · client not loaded yet")
+                    st.markdown(f"**{provider}** · circuit {state.replace('_', '-')}{loaded}  \n"
+                                f"{guard.stats.calls} calls · {guard.stats.retries} retries · "
+                                f"{guard.stats.failures} failures · {guard.stats.rejected} rejected")
+            
+            with st.expander("📈 Instrumentation"):
+                self.render_instrumentation()
         
         # Main interface
         if st.session_state.portal_phase == "selection":
@@ -297,5 +577,7 @@ class TribunalPortalApp:
             self.render_conversation_interface()
 
 if __name__ == "__main__":
-    app = TribunalPortalApp()
-    app.run()
+    # Covers the whole script run, including st.rerun() and st.stop() exits
+    with RERUN_LATENCY.labels().time():
+        app = TribunalPortalApp()
+        app.run()
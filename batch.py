@@ -0,0 +1,198 @@
+"""Run tribunals over a file of queries without the Streamlit UI.
+
+    python batch.py queries.jsonl --out results.jsonl --tier enterprise --concurrency 16
+
+Input is JSONL (one object per line) or CSV with a header row. Each record needs a ``query``
+and may set ``id``, ``personas`` (comma-separated in CSV), ``context`` and ``user_id``.
+Progress is checkpointed in GestaltViewDB together with each saved tribunal, so re-running the
+same job skips the items that already finished and appends only the rest to the output.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Union
+
+from cache import ResponseCache, SQLiteCache
+from database import GestaltViewDB
+from tribunal import TribunalService
+
+
+@dataclass
+class BatchItem:
+    item_id: str
+    query: str
+    personas: Optional[List[str]] = None
+    context: str = ""
+    user_id: str = ""
+
+
+@dataclass
+class InvalidRecord:
+    """A line or row that couldn't be read as a batch item; counted as failed, never checkpointed"""
+    item_id: str
+    error: str
+
+
+@dataclass
+class BatchStats:
+    done: int = 0
+    failed: int = 0
+    skipped: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.done / elapsed if elapsed else 0.0
+
+
+def _item(record: dict, default_id: str) -> BatchItem:
+    if not isinstance(record, dict):
+        raise ValueError(f"record {default_id} is not an object")
+    query = record.get("query")
+    if not isinstance(query, str) or not query.strip():
+        raise ValueError(f"record {default_id} has no query")
+    personas = record.get("personas")
+    if isinstance(personas, str):
+        personas = [persona.strip() for persona in personas.split(",") if persona.strip()]
+    return BatchItem(str(record.get("id") or default_id), query.strip(), personas or None,
+                     record.get("context") or "", record.get("user_id") or "")
+
+
+def _parse(read: Callable[[], dict], default_id: str) -> Union[BatchItem, InvalidRecord]:
+    try:
+        return _item(read(), default_id)
+    except (ValueError, csv.Error) as e:
+        return InvalidRecord(default_id, str(e))
+
+
+def read_items(path: str) -> Iterator[Union[BatchItem, InvalidRecord]]:
+    """Stream batch items from a JSONL or CSV file; items without an id are numbered by position.
+
+    A malformed line or row is yielded as an InvalidRecord instead of ending the stream.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+            number = 0
+            while True:
+                number += 1
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    yield InvalidRecord(f"row-{number}", str(e))
+                    continue
+                yield _parse(lambda: row, f"row-{number}")
+        else:
+            for number, line in enumerate(f, start=1):
+                if line.strip():
+                    yield _parse(lambda: json.loads(line), f"line-{number}")
+
+
+async def run_batch(service: TribunalService, db: GestaltViewDB, items: Iterable[Union[BatchItem, InvalidRecord]],
+                    job_id: str, out: TextIO, default_personas: List[str], concurrency: int = 8,
+                    deadline: Optional[float] = None, progress_every: int = 100) -> BatchStats:
+    """Run every item not yet checkpointed for job_id, at most `concurrency` tribunals at a time.
+
+    Only a bounded queue of items is held in memory. Each finished tribunal is saved and
+    checkpointed in one transaction, then written to `out` as one JSON line. Items whose
+    personas all failed are not checkpointed, so the next run retries them. Invalid records
+    are counted as failed and skipped.
+    """
+    stats = BatchStats()
+    completed = await asyncio.to_thread(db.batch_completed, job_id)
+    pending: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def produce():
+        for item in items:
+            if isinstance(item, InvalidRecord):
+                stats.failed += 1
+                print(f"{item.item_id}: {item.error}", file=sys.stderr)
+                continue
+            if item.item_id in completed:
+                stats.skipped += 1
+                continue
+            await pending.put(item)
+        for _ in range(concurrency):
+            await pending.put(None)
+
+    async def process(item: BatchItem):
+        try:
+            tribunal = await service.summon_tribunal(item.personas or default_personas, item.query, item.context,
+                                                     deadline=deadline)
+        except Exception as e:
+            stats.failed += 1
+            print(f"{item.item_id}: {e}", file=sys.stderr)
+            return
+
+        answered = [result for result in tribunal['results'] if not result.pending]
+        if not answered or all(result.error for result in answered):
+            stats.failed += 1
+            reason = answered[0].text if answered else "no persona was available"
+            print(f"{item.item_id}: {reason}", file=sys.stderr)
+            return
+
+        session_id = await asyncio.to_thread(db.save_batch_item, job_id, item.item_id,
+                                             item.user_id or f"batch:{job_id}", item.query, tribunal)
+        out.write(json.dumps({
+            'id': item.item_id,
+            'query': item.query,
+            'session_id': session_id,
+            'consensus_score': tribunal['consensus_score'],
+            'responses': {result.persona_id: result.text for result in answered},
+            'errors': [result.persona_id for result in answered if result.error],
+            'pending': tribunal['pending'],
+            'skipped': tribunal['skipped'],
+        }) + "\n")
+        out.flush()
+        stats.done += 1
+        if stats.done % progress_every == 0:
+            print(f"{stats.done} done, {stats.failed} failed, {stats.skipped} skipped "
+                  f"({stats.rate:.1f} tribunals/s)", file=sys.stderr)
+
+    async def work():
+        while True:
+            item = await pending.get()
+            if item is None:
+                return
+            await process(item)
+
+    await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run GestaltView tribunals over a JSONL or CSV file of queries")
+    parser.add_argument("input", help="JSONL or CSV file of queries")
+    parser.add_argument("--out", help="JSONL file results are appended to (default: <input>.results.jsonl)")
+    parser.add_argument("--job", help="Checkpoint name; re-running a job resumes it (default: input file name)")
+    parser.add_argument("--db", default="gestaltview.db", help="GestaltViewDB file for sessions and checkpoints")
+    parser.add_argument("--tier", default="enterprise", choices=["basic", "premium", "enterprise"],
+                        help="Personas used for items that don't list their own")
+    parser.add_argument("--concurrency", type=int, default=8, help="Tribunals in flight at once")
+    parser.add_argument("--deadline", type=float, help="Seconds before slow personas are recorded as pending")
+    parser.add_argument("--cache", action="store_true", help="Reuse cached persona answers from the database")
+    args = parser.parse_args()
+
+    job_id = args.job or os.path.basename(args.input)
+    db = GestaltViewDB(args.db)
+    service = TribunalService(cache=ResponseCache([SQLiteCache(db)]) if args.cache else None)
+    personas = [persona.id for persona in service.get_available_personas(args.tier)]
+
+    with open(args.out or f"{args.input}.results.jsonl", "a", encoding="utf-8") as out:
+        stats = asyncio.run(run_batch(service, db, read_items(args.input), job_id, out, personas,
+                                      concurrency=args.concurrency, deadline=args.deadline))
+    db.close()
+    print(f"Job {job_id}: {stats.done} done, {stats.failed} failed, {stats.skipped} already done "
+          f"({stats.rate:.1f} tribunals/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
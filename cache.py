@@ -0,0 +1,200 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from database import GestaltViewDB
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, Unicode forms, whitespace and trailing punctuation so near-identical queries share a key"""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip(" .!?")
+
+
+def cache_key(persona_id: str, model: str, query: str, context: str = "") -> str:
+    """Cache key for one persona answer: persona, model, normalized query and a hash of the context"""
+    context_hash = hashlib.sha256(context.encode("utf-8")).hexdigest()
+    raw = "\x1f".join((persona_id, model, normalize_query(query), context_hash))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    errors: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class CacheTier:
+    """One storage level of the response cache"""
+
+    name: str = ""
+    # Tiers that do I/O are consulted from a worker thread instead of the event loop
+    blocking: bool = False
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def put(self, key: str, text: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class MemoryCache(CacheTier):
+    """In-process LRU tier with a per-entry TTL"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 3600.0):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            expires_at, text = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.stats.misses += 1
+                self.stats.evictions += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return text
+
+    def put(self, key: str, text: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheTier):
+    """Persistent tier in GestaltViewDB, shared by every worker on the same database file"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, db: GestaltViewDB, max_bytes: int = 64 * 1024 * 1024, ttl: float = 7 * 24 * 3600.0,
+                 evict_every: int = 100):
+        super().__init__()
+        self.db = db
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self._puts = 0
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.db.cache_get(key)
+        if text is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return text
+
+    def put(self, key: str, text: str):
+        self.db.cache_put(key, text, self.ttl)
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.stats.evictions += self.db.cache_evict(self.max_bytes)
+
+    def clear(self):
+        self.db.cache_clear()
+
+
+class ResponseCache:
+    """Tiered persona response cache; a hit in a slower tier is promoted to the faster ones.
+
+    A failing tier is counted and skipped, so a locked database never fails a tribunal.
+    """
+
+    def __init__(self, tiers: List[CacheTier]):
+        self.tiers = tiers
+
+    @staticmethod
+    def _tier_get(tier: CacheTier, key: str) -> Optional[str]:
+        try:
+            return tier.get(key)
+        except Exception:
+            tier.stats.errors += 1
+            return None
+
+    @staticmethod
+    def _tier_put(tier: CacheTier, key: str, text: str):
+        try:
+            tier.put(key, text)
+        except Exception:
+            tier.stats.errors += 1
+
+    def get(self, key: str) -> Optional[str]:
+        for i, tier in enumerate(self.tiers):
+            text = self._tier_get(tier, key)
+            if text is not None:
+                for faster in self.tiers[:i]:
+                    self._tier_put(faster, key, text)
+                return text
+        return None
+
+    def put(self, key: str, text: str):
+        for tier in self.tiers:
+            self._tier_put(tier, key, text)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Look a key up from the event loop, moving blocking tiers off it"""
+        for i, tier in enumerate(self.tiers):
+            if tier.blocking:
+                text = await asyncio.to_thread(self._tier_get, tier, key)
+            else:
+                text = self._tier_get(tier, key)
+            if text is not None:
+                for faster in self.tiers[:i]:
+                    self._tier_put(faster, key, text)
+                return text
+        return None
+
+    async def aput(self, key: str, text: str):
+        for tier in self.tiers:
+            if tier.blocking:
+                await asyncio.to_thread(self._tier_put, tier, key, text)
+            else:
+                self._tier_put(tier, key, text)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> List[Tuple[str, CacheStats]]:
+        return [(tier.name, tier.stats) for tier in self.tiers]
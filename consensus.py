@@ -0,0 +1,161 @@
+import re
+import sys
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from database import GestaltViewDB
+
+# Width of the hashed feature space; collisions stay rare for answers of a few hundred words
+DIMENSIONS = 2 ** 12
+
+# Function words that would otherwise make any two English answers look alike
+STOPWORDS = frozenset("""
+    a about an and are as at be been but by can could do does for from has have how i if in into is it
+    its just me more my no not of on or our so than that the their them then there these they this to
+    up us was we were what when where which who will with would you your
+""".split())
+
+WORD = re.compile(r"[a-z0-9']+")
+
+# crc32 of recently seen words; cleared when full, since re-hashing a word is cheap
+_WORD_HASHES: Dict[str, int] = {}
+_WORD_HASHES_MAX = 200_000
+
+
+def _word_hashes(words: List[str]) -> np.ndarray:
+    cache = _WORD_HASHES
+    hashes = list(map(cache.get, words))
+    for i, value in enumerate(hashes):
+        if value is None:
+            if len(cache) >= _WORD_HASHES_MAX:
+                cache.clear()
+            hashes[i] = cache[words[i]] = zlib.crc32(words[i].encode("utf-8"))
+    return np.array(hashes, dtype=np.uint64)
+
+
+_STOPWORD_HASHES = _word_hashes(sorted(STOPWORDS))
+
+
+def sparse_vectors(texts: Sequence[str], dimensions: int = DIMENSIONS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Hashed content-word unigram and bigram vectors as (row, bucket, weight) triples.
+
+    Weights are sublinear term frequencies, L2-normalised per text. Words are hashed with crc32
+    rather than hash() so the buckets are stable across processes and re-scored history matches
+    what was computed live. Every text's words are hashed in one pass; stopword removal and
+    bigram hashing happen in NumPy.
+    """
+    words = [WORD.findall(text.lower()) for text in texts]
+    lengths = np.array([len(text_words) for text_words in words], dtype=np.int64)
+    rows = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+    unigrams = _word_hashes([word for text_words in words for word in text_words])
+    content = ~np.isin(unigrams, _STOPWORD_HASHES)
+    rows, unigrams = rows[content], unigrams[content]
+
+    # Adjacent content words form a bigram unless the second one starts the next text
+    same_text = rows[1:] == rows[:-1]
+    bigrams = (unigrams[:-1][same_text] * np.uint64(0x9E3779B1) + unigrams[1:][same_text]) & np.uint64(0xFFFFFFFF)
+    rows = np.concatenate((rows, rows[:-1][same_text]))
+    buckets = (np.concatenate((unigrams, bigrams)) % np.uint64(dimensions)).astype(np.int64)
+
+    keys, counts = np.unique(rows * dimensions + buckets, return_counts=True)
+    rows, buckets = np.divmod(keys, dimensions)
+    weights = np.log1p(counts)
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(texts)))
+    return rows, buckets, weights / norms[rows]
+
+
+def vectorize(texts: Sequence[str], dimensions: int = DIMENSIONS) -> np.ndarray:
+    """Dense unit vectors of texts, one row per text (see sparse_vectors)"""
+    rows, buckets, weights = sparse_vectors(texts, dimensions)
+    vectors = np.zeros((len(texts), dimensions))
+    vectors[rows, buckets] = weights
+    return vectors
+
+
+def similarity_matrix(texts: Sequence[str]) -> np.ndarray:
+    """Pairwise cosine similarity of texts"""
+    vectors = vectorize(texts)
+    return vectors @ vectors.T
+
+
+def score_groups(groups: Sequence[Sequence[str]]) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """Consensus of many tribunals at once, plus every answer's outlier score.
+
+    With unit vectors, the sum of a tribunal's pairwise similarities is |sum of its vectors|^2
+    minus its self-similarities, so one pass over the sparse vectors scores every tribunal
+    without building per-tribunal similarity matrices.
+
+    Consensus is the mean pairwise cosine similarity. An answer's outlier score is how far its
+    mean similarity to the others falls below the tribunal's consensus, from 0 (as close as the
+    average answer or closer) to 1 (nothing in common). Tribunals with fewer than two answers
+    score 0.
+    """
+    sizes = np.array([len(group) for group in groups], dtype=np.int64)
+    texts = [text for group in groups for text in group]
+    rows, buckets, weights = sparse_vectors(texts)
+
+    text_group = np.repeat(np.arange(len(groups)), sizes)
+    slots = text_group[rows] * DIMENSIONS + buckets
+    sums = np.bincount(slots, weights=weights, minlength=len(groups) * DIMENSIONS)
+    self_similarity = np.bincount(rows, weights=weights * weights, minlength=len(texts))
+    to_others = np.bincount(rows, weights=weights * sums[slots], minlength=len(texts)) - self_similarity
+
+    pairs = (sizes * (sizes - 1)).astype(np.float64)
+    total = (np.square(sums).reshape(len(groups), DIMENSIONS).sum(axis=1)
+             - np.bincount(text_group, weights=self_similarity, minlength=len(groups)))
+    consensus = np.clip(np.divide(total, pairs, out=np.zeros(len(groups)), where=pairs > 0), 0.0, 1.0)
+
+    others = (sizes - 1)[text_group].astype(np.float64)
+    agreement = np.divide(to_others, others, out=np.zeros(len(texts)), where=others > 0)
+    expected = consensus[text_group]
+    outliers = np.clip(1.0 - np.divide(agreement, expected, out=np.ones(len(texts)), where=expected > 0), 0.0, 1.0)
+    outliers[others == 0] = 0.0
+    return consensus, np.split(outliers, np.cumsum(sizes)[:-1])
+
+
+@dataclass
+class ConsensusResult:
+    consensus_score: float = 0.0
+    outliers: Dict[str, float] = field(default_factory=dict)  # persona id -> outlier score
+
+
+def score_tribunal(answers: Dict[str, str]) -> ConsensusResult:
+    """Consensus and outlier scores for one tribunal's answers, keyed by persona id"""
+    consensus, outliers = score_groups([list(answers.values())])
+    return ConsensusResult(float(consensus[0]), dict(zip(answers, outliers[0].tolist())))
+
+
+def rescore_history(db: GestaltViewDB, ignore_prefix: str = "", batch_sessions: int = 128) -> int:
+    """Recompute consensus and outlier scores for every stored tribunal, a batch of sessions at a time.
+
+    Answers starting with ignore_prefix (the unavailable notice) are left out. Returns the number
+    of sessions re-scored.
+    """
+    rescored = 0
+    for batch in db.iter_session_answers(batch_sessions):
+        groups = [[(persona_id, text) for persona_id, text in answers
+                   if text and not (ignore_prefix and text.startswith(ignore_prefix))]
+                  for _session_id, answers in batch]
+        consensus, outliers = score_groups([[text for _persona_id, text in group] for group in groups])
+        db.update_consensus(
+            ((float(score), session_id) for score, (session_id, _answers) in zip(consensus, batch)),
+            _outlier_rows(batch, groups, outliers)
+        )
+        rescored += len(batch)
+    return rescored
+
+
+def _outlier_rows(batch, groups, outliers) -> Iterable[Tuple[float, str, str]]:
+    for (session_id, _answers), group, scores in zip(batch, groups, outliers):
+        for (persona_id, _text), score in zip(group, scores.tolist()):
+            yield score, session_id, persona_id
+
+
+if __name__ == "__main__":
+    from tribunal import UNAVAILABLE_NOTICE
+
+    database = GestaltViewDB(sys.argv[1] if len(sys.argv) > 1 else "gestaltview.db")
+    print(f"Re-scored {rescore_history(database, ignore_prefix=UNAVAILABLE_NOTICE)} tribunals")
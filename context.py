@@ -0,0 +1,99 @@
+import re
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Deque, Dict, List, Optional
+
+# Persona answers are clipped to this many tokens when they enter the recent-turn window
+ANSWER_TOKENS = 60
+# The user's query is clipped too, so one long pasted message can't blow up the newest turn
+QUERY_TOKENS = ANSWER_TOKENS * 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (about four characters per token), good enough for budgeting"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def clip_tokens(text: str, tokens: int) -> str:
+    """Shorten text to roughly the given token budget on a word boundary"""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def first_sentence(text: str) -> str:
+    match = re.match(r"\s*(.+?[.!?])(\s|$)", text, re.S)
+    return (match.group(1) if match else text).strip()
+
+
+def extractive_summary(turn: "Turn") -> str:
+    """Default summarizer: one line per turn with the query and each persona's opening sentence"""
+    line = f"User asked \"{clip_tokens(turn.query, 30)}\""
+    answers = "; ".join(f"{persona}: {clip_tokens(first_sentence(text), 30)}"
+                        for persona, text in turn.answers.items())
+    return f"{line} — {answers}" if answers else line
+
+
+@dataclass
+class Turn:
+    query: str
+    answers: Dict[str, str] = field(default_factory=dict)
+
+    def render(self) -> str:
+        lines = [f"User: {clip_tokens(self.query, QUERY_TOKENS)}"]
+        lines += [f"{persona}: {clip_tokens(text, ANSWER_TOKENS)}" for persona, text in self.answers.items()]
+        return "\n".join(lines)
+
+
+class ConversationContext:
+    """Token-budgeted sliding window of recent turns plus a rolling summary of older turns.
+
+    When a turn falls out of the window it is summarized on its own and appended to the
+    summary, whose oldest lines are dropped once it exceeds its budget. Nothing is ever
+    re-summarized, so each update costs the same however long the conversation runs.
+    """
+
+    def __init__(self, window_tokens: int = 800, summary_tokens: int = 250,
+                 summarizer: Optional[Callable[[Turn], str]] = None):
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or extractive_summary
+        self.turns: Deque[Turn] = deque()
+        self.summary: Deque[str] = deque()
+        self._window_used = 0
+        self._summary_used = 0
+        self.turns_seen = 0
+
+    def add_turn(self, query: str, answers: Dict[str, str]):
+        """Record a finished tribunal and slide older turns into the summary"""
+        turn = Turn(query, dict(answers))
+        self.turns.append(turn)
+        self._window_used += estimate_tokens(turn.render())
+        self.turns_seen += 1
+
+        # Always keep the newest turn, even if it alone exceeds the budget
+        while self._window_used > self.window_tokens and len(self.turns) > 1:
+            evicted = self.turns.popleft()
+            self._window_used -= estimate_tokens(evicted.render())
+            self._summarize(evicted)
+
+    def _summarize(self, turn: Turn):
+        line = clip_tokens(self.summarizer(turn), self.summary_tokens)
+        self.summary.append(line)
+        self._summary_used += estimate_tokens(line)
+        while self._summary_used > self.summary_tokens and len(self.summary) > 1:
+            self._summary_used -= estimate_tokens(self.summary.popleft())
+
+    def render(self) -> str:
+        """Context string for TribunalService: the summary followed by the recent turns"""
+        parts: List[str] = []
+        if self.summary:
+            parts.append("Earlier in this conversation:\n" + "\n".join(self.summary))
+        if self.turns:
+            parts.append("Recent conversation:\n" + "\n\n".join(turn.render() for turn in self.turns))
+        return "\n\n".join(parts)
+
+    @property
+    def tokens(self) -> int:
+        return self._window_used + self._summary_used
@@ -1,17 +1,191 @@
+import itertools
 import sqlite3
 import json
-from datetime import datetime
-from typing import Dict, Any, Optional
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 import uuid
 
+from metrics import DB_ERRORS, DB_LATENCY, timed
+
+# Bumped whenever init_database needs to migrate existing files (stored in PRAGMA user_version)
+SCHEMA_VERSION = 4
+
+# Columns get_session_history may return; the default projection is covered by the history index
+HISTORY_COLUMNS = ("session_id", "created_at", "query_text", "consensus_score",
+                   "empowerment_consensus", "revolutionary_potential")
+DEFAULT_HISTORY_COLUMNS = ("session_id", "created_at", "query_text", "consensus_score")
+
+# Keyset pagination position: the (created_at, session_id) of the last row already returned
+HistoryCursor = Tuple[str, str]
+
+# Keyset pagination position for bucket drops: the (created_at, drop_id) of the last row already returned
+DropCursor = Tuple[str, str]
+
+# JSON columns of consciousness_profiles, updated with RFC 7396 merge patches
+PROFILE_JSON_COLUMNS = ("plk_data", "tapestry_nodes", "musical_dna")
+
+# Providers that had a fixed *_response column in tribunal_sessions before schema version 2
+LEGACY_PROVIDER_COLUMNS = ("openai", "anthropic", "gemini", "perplexity")
+
+# Tables with a full-text index, and the column it covers
+FULL_TEXT_SOURCES = {"bucket_drops": "content", "tribunal_sessions": "query_text"}
+
+INSERT_SESSION = """
+    INSERT INTO tribunal_sessions (session_id, user_id, query_text, consensus_score,
+                                   empowerment_consensus, revolutionary_potential, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+UPDATE_SCORES = """
+    UPDATE tribunal_sessions
+    SET consensus_score = ?, empowerment_consensus = ?, revolutionary_potential = ?
+    WHERE session_id = ?
+"""
+INSERT_RESPONSE = """
+    INSERT OR REPLACE INTO tribunal_responses (session_id, persona_id, provider, text, latency_ms, tokens,
+                                               outlier_score)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def utc_timestamp() -> str:
+    """The current UTC time in the format SQLite's strftime('%Y-%m-%d %H:%M:%f', 'now') produces"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def session_row(session_id: str, user_id: str, query: str, tribunal: Dict[str, Any],
+                created_at: Optional[str] = None) -> tuple:
+    """A tribunal_sessions row for INSERT_SESSION"""
+    return (
+        session_id,
+        user_id,
+        query,
+        tribunal.get('consensus_score', 0.0),
+        tribunal.get('empowerment_consensus', 0.0),
+        tribunal.get('revolutionary_potential', 0.0),
+        created_at or utc_timestamp()
+    )
+
+
+def score_row(session_id: str, tribunal: Dict[str, Any]) -> tuple:
+    """Parameters of UPDATE_SCORES"""
+    return (
+        tribunal.get('consensus_score', 0.0),
+        tribunal.get('empowerment_consensus', 0.0),
+        tribunal.get('revolutionary_potential', 0.0),
+        session_id
+    )
+
+
+def response_rows(session_id: str, results: Iterable[Any]) -> List[tuple]:
+    """tribunal_responses rows for INSERT_RESPONSE, one per PersonaResponse"""
+    return [
+        (session_id, result.persona_id, result.provider, result.text, result.latency_ms, result.tokens,
+         result.outlier_score)
+        for result in results
+    ]
+
+
+def user_key(user_id: Optional[str]) -> str:
+    """The single-token form of a user id stored in the full-text indexes (matches 'u' || hex(user_id))"""
+    return "u" + (user_id or "").encode("utf-8").hex().upper()
+
+
+def match_expression(query: str) -> str:
+    """FTS5 query for free text: every word must appear, quoted so punctuation can't break the syntax.
+
+    A trailing * on a word keeps its meaning as a prefix search.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith("*") and len(word) > 1
+        word = word.rstrip("*").replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+class ConnectionPool:
+    """Queue-based pool of SQLite connections in WAL mode, shared by every session.
+
+    Connections are opened lazily up to ``size`` and handed out one thread at a
+    time; each keeps its own prepared-statement cache between checkouts.
+    """
+
+    def __init__(self, db_path: str, size: int = 8, busy_timeout: float = 5.0, cached_statements: int = 256):
+        self.db_path = db_path
+        # Every connection to ":memory:" is a separate database, so share a single one
+        self.size = 1 if db_path == ":memory:" else size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.busy_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"connection pool exhausted ({self.size} connections busy)") from None
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Check out a connection for one transaction, committing on success"""
+        conn = self._acquire()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+
+
 class GestaltViewDB:
-    def __init__(self, db_path: str = "gestaltview.db"):
+    def __init__(self, db_path: str = "gestaltview.db", pool_size: int = 8, busy_timeout: float = 5.0):
         self.db_path = db_path
+        self.pool = ConnectionPool(db_path, size=pool_size, busy_timeout=busy_timeout)
         self.init_database()
 
     def init_database(self):
         """Initialize the GestaltView consciousness database"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS users (
                     user_id TEXT PRIMARY KEY,
@@ -64,43 +238,502 @@ class GestaltViewDB:
                 )
             """)
 
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tribunal_responses (
+                    session_id TEXT NOT NULL,
+                    persona_id TEXT NOT NULL,
+                    provider TEXT NOT NULL,
+                    text TEXT,
+                    latency_ms REAL,
+                    tokens INTEGER,
+                    outlier_score REAL,
+                    PRIMARY KEY (session_id, persona_id),
+                    FOREIGN KEY (session_id) REFERENCES tribunal_sessions (session_id)
+                ) WITHOUT ROWID
+            """)
+
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_expiry ON response_cache (expires_at)")
+
+            # Checkpoints of batch.py jobs: one row per input item already processed
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_progress (
+                    job_id TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    session_id TEXT,
+                    status TEXT NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, item_id)
+                ) WITHOUT ROWID
+            """)
+
+            # Covering index for per-user history, newest first; session_id breaks created_at ties
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_tribunal_sessions_user_history
+                ON tribunal_sessions (user_id, created_at, session_id, query_text, consensus_score)
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bucket_drops_user ON bucket_drops (user_id, created_at, drop_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_consciousness_profiles_user ON consciousness_profiles (user_id)")
+
+            # Full-text indexes over drop content and tribunal queries. They are contentless (the text
+            # lives only in the source tables) and keyed by the source rowid. user_key holds the owner
+            # as a single token, so a user's matches are found by intersecting two posting lists
+            # instead of filtering every user's matches.
+            for table, column in FULL_TEXT_SOURCES.items():
+                conn.execute(f"""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(user_key, {column}, content='')
+                """)
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {table}_fts (rowid, user_key, {column})
+                        VALUES (new.rowid, 'u' || hex(new.user_id), new.{column});
+                    END
+                """)
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {table}_fts ({table}_fts, rowid, user_key, {column})
+                        VALUES ('delete', old.rowid, 'u' || hex(old.user_id), old.{column});
+                    END
+                """)
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF user_id, {column} ON {table} BEGIN
+                        INSERT INTO {table}_fts ({table}_fts, rowid, user_key, {column})
+                        VALUES ('delete', old.rowid, 'u' || hex(old.user_id), old.{column});
+                        INSERT INTO {table}_fts (rowid, user_key, {column})
+                        VALUES (new.rowid, 'u' || hex(new.user_id), new.{column});
+                    END
+                """)
+
+            self.migrate(conn)
+
+    def migrate(self, conn: sqlite3.Connection):
+        """Bring an existing database file up to SCHEMA_VERSION"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+        if version < 2:
+            # Copy the fixed per-provider columns into tribunal_responses. The persona behind a
+            # legacy answer was never recorded, so the provider name stands in for the persona id.
+            for provider in LEGACY_PROVIDER_COLUMNS:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO tribunal_responses (session_id, persona_id, provider, text)
+                    SELECT session_id, ?, ?, {provider}_response FROM tribunal_sessions
+                    WHERE {provider}_response IS NOT NULL
+                """, (provider, provider))
+
+        if version < 3:
+            # Files from version 2 created tribunal_responses without the outlier column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tribunal_responses)")}
+            if "outlier_score" not in columns:
+                conn.execute("ALTER TABLE tribunal_responses ADD COLUMN outlier_score REAL")
+
+        if version < 4:
+            # The full-text indexes were just created empty; index the rows written before them
+            for table, column in FULL_TEXT_SOURCES.items():
+                conn.execute(f"""
+                    INSERT INTO {table}_fts (rowid, user_key, {column})
+                    SELECT rowid, 'u' || hex(user_id), {column} FROM {table}
+                """)
+
+        if version < SCHEMA_VERSION:
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def health_check(self) -> bool:
+        """Whether the database file is reachable and answering queries"""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("SELECT 1 FROM tribunal_sessions LIMIT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    @timed(DB_LATENCY, DB_ERRORS)
     def create_tribunal_session(self, user_id: str, query: str) -> str:
         """Create a new tribunal session"""
         session_id = str(uuid.uuid4())
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             conn.execute(
                 "INSERT INTO tribunal_sessions (session_id, user_id, query_text) VALUES (?, ?, ?)",
                 (session_id, user_id, query)
             )
         return session_id
 
+    @timed(DB_LATENCY, DB_ERRORS)
+    def save_tribunal(self, user_id: str, query: str, tribunal: Dict[str, Any]) -> str:
+        """Save a tribunal session and all of its persona responses in one transaction"""
+        with self.pool.connection() as conn:
+            return self._insert_tribunal(conn, user_id, query, tribunal)
+
+    def _insert_tribunal(self, conn: sqlite3.Connection, user_id: str, query: str, tribunal: Dict[str, Any]) -> str:
+        session = session_row(str(uuid.uuid4()), user_id, query, tribunal)
+        conn.execute(INSERT_SESSION, session)
+        self._insert_responses(conn, session[0], tribunal.get('results', []))
+        return session[0]
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def write_batch(self, sessions: Sequence[tuple] = (), scores: Sequence[tuple] = (), responses: Sequence[tuple] = ()):
+        """Apply queued writes in one transaction.
+
+        sessions are session_row() tuples, scores are score_row() tuples and responses are
+        response_rows() tuples; rows of each kind are applied in order, sessions first.
+        """
+        with self.pool.connection() as conn:
+            conn.executemany(INSERT_SESSION, sessions)
+            conn.executemany(UPDATE_SCORES, scores)
+            conn.executemany(INSERT_RESPONSE, responses)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def save_batch_item(self, job_id: str, item_id: str, user_id: str, query: str, tribunal: Dict[str, Any],
+                        status: str = "done") -> str:
+        """Save a batch item's tribunal and mark the item processed in the same transaction"""
+        with self.pool.connection() as conn:
+            session_id = self._insert_tribunal(conn, user_id, query, tribunal)
+            conn.execute(
+                "INSERT OR REPLACE INTO batch_progress (job_id, item_id, session_id, status, completed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (job_id, item_id, session_id, status, time.time())
+            )
+        return session_id
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def batch_completed(self, job_id: str) -> Set[str]:
+        """Ids of the items a batch job has already processed"""
+        with self.pool.connection() as conn:
+            rows = conn.execute("SELECT item_id FROM batch_progress WHERE job_id = ?", (job_id,)).fetchall()
+        return {row[0] for row in rows}
+
+    @timed(DB_LATENCY, DB_ERRORS)
     def save_tribunal_response(self, session_id: str, responses: Dict[str, Any]):
         """Save tribunal responses to database"""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute("""
-                UPDATE tribunal_sessions
-                SET openai_response = ?, anthropic_response = ?, gemini_response = ?,
-                    perplexity_response = ?, consensus_score = ?, empowerment_consensus = ?,
-                    revolutionary_potential = ?
+        with self.pool.connection() as conn:
+            conn.execute(UPDATE_SCORES, score_row(session_id, responses))
+            self._insert_responses(conn, session_id, responses.get('results', []))
+
+    def _insert_responses(self, conn: sqlite3.Connection, session_id: str, results: Iterable[Any]):
+        conn.executemany(INSERT_RESPONSE, response_rows(session_id, results))
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def get_session_responses(self, session_id: str) -> List[tuple]:
+        """Get every persona response recorded for a session"""
+        with self.pool.connection() as conn:
+            cursor = conn.execute("""
+                SELECT persona_id, provider, text, latency_ms, tokens, outlier_score
+                FROM tribunal_responses
                 WHERE session_id = ?
-            """, (
-                responses.get('openai'),
-                responses.get('anthropic'),
-                responses.get('gemini'),
-                responses.get('perplexity'),
-                responses.get('consensus_score', 0.0),
-                responses.get('empowerment_consensus', 0.0),
-                responses.get('revolutionary_potential', 0.0),
-                session_id
-            ))
+            """, (session_id,))
+            return cursor.fetchall()
+
+    def iter_session_answers(self, batch_sessions: int = 128) -> Iterator[List[Tuple[str, List[Tuple[str, str]]]]]:
+        """Walk every stored tribunal in session_id order, yielding batches of (session_id, [(persona_id, text)]).
+
+        Each batch is one range scan of the tribunal_responses primary key, and no connection is
+        held between batches.
+        """
+        after = ""
+        while True:
+            with self.pool.connection() as conn:
+                rows = conn.execute("""
+                    SELECT session_id, persona_id, text FROM tribunal_responses
+                    WHERE session_id IN (
+                        SELECT DISTINCT session_id FROM tribunal_responses
+                        WHERE session_id > ? ORDER BY session_id LIMIT ?
+                    )
+                    ORDER BY session_id, persona_id
+                """, (after, batch_sessions)).fetchall()
+            if not rows:
+                return
+            batch: List[Tuple[str, List[Tuple[str, str]]]] = []
+            for session_id, persona_id, text in rows:
+                if not batch or batch[-1][0] != session_id:
+                    batch.append((session_id, []))
+                batch[-1][1].append((persona_id, text))
+            yield batch
+            after = batch[-1][0]
 
+    @timed(DB_LATENCY, DB_ERRORS)
+    def update_consensus(self, sessions: Iterable[Tuple[float, str]], outliers: Iterable[Tuple[float, str, str]]):
+        """Store recomputed scores: (consensus_score, session_id) and (outlier_score, session_id, persona_id) rows"""
+        with self.pool.connection() as conn:
+            conn.executemany("UPDATE tribunal_sessions SET consensus_score = ? WHERE session_id = ?", sessions)
+            conn.executemany(
+                "UPDATE tribunal_responses SET outlier_score = ? WHERE session_id = ? AND persona_id = ?", outliers
+            )
+
+    @timed(DB_LATENCY, DB_ERRORS)
     def get_user_sessions(self, user_id: str, limit: int = 10):
         """Get recent tribunal sessions for user"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.pool.connection() as conn:
             cursor = conn.execute("""
                 SELECT * FROM tribunal_sessions
                 WHERE user_id = ?
-                ORDER BY created_at DESC
+                ORDER BY created_at DESC, session_id DESC
                 LIMIT ?
             """, (user_id, limit))
             return cursor.fetchall()
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def get_session_history(self, user_id: str, limit: int = 20, cursor: Optional[HistoryCursor] = None,
+                            columns: Sequence[str] = DEFAULT_HISTORY_COLUMNS
+                            ) -> Tuple[List[Dict[str, Any]], Optional[HistoryCursor]]:
+        """Get one page of a user's tribunal history, newest first.
+
+        Pass the returned cursor back to fetch the next page; it is None once the history is exhausted.
+        Paging seeks on the history index, so every page costs the same however deep it is.
+        """
+        unknown = set(columns) - set(HISTORY_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown history columns: {', '.join(sorted(unknown))}")
+
+        select = ", ".join(["created_at", "session_id", *columns])
+        sql = f"SELECT {select} FROM tribunal_sessions WHERE user_id = ?"
+        params: List[Any] = [user_id]
+        if cursor is not None:
+            sql += " AND (created_at, session_id) < (?, ?)"
+            params.extend(cursor)
+        sql += " ORDER BY created_at DESC, session_id DESC LIMIT ?"
+        params.append(limit)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        page = [dict(zip(columns, row[2:])) for row in rows]
+        next_cursor = (rows[-1][0], rows[-1][1]) if len(rows) == limit else None
+        return page, next_cursor
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def cache_get(self, cache_key: str) -> Optional[str]:
+        """Get a cached persona response, ignoring expired entries"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT text FROM response_cache WHERE cache_key = ? AND expires_at > ?",
+                (cache_key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def cache_put(self, cache_key: str, text: str, ttl: float):
+        """Store a persona response for ttl seconds"""
+        now = time.time()
+        with self.pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (cache_key, text, size, created_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (cache_key, text, len(text.encode("utf-8")), now, now + ttl)
+            )
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def cache_evict(self, max_bytes: int) -> int:
+        """Drop expired responses, then the ones closest to expiry until the cache fits in max_bytes.
+
+        Returns the number of rows removed.
+        """
+        with self.pool.connection() as conn:
+            removed = conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+            removed += conn.execute("""
+                DELETE FROM response_cache WHERE cache_key IN (
+                    SELECT cache_key FROM (
+                        SELECT cache_key, SUM(size) OVER (ORDER BY expires_at DESC) AS running_size
+                        FROM response_cache
+                    ) WHERE running_size > ?
+                )
+            """, (max_bytes,)).rowcount
+        return removed
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def cache_clear(self):
+        with self.pool.connection() as conn:
+            conn.execute("DELETE FROM response_cache")
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def ingest_drops(self, drops: Iterable[Dict[str, Any]], batch_size: int = 5000) -> int:
+        """Insert bucket drops in batched transactions, streaming from any iterable; returns the number written.
+
+        Each drop needs user_id and content and may set drop_id (a new uuid by default),
+        emotional_intensity, plk_resonance and created_at (now by default). A drop whose id
+        already exists is updated in place, and the full-text index follows either way.
+        """
+        written = 0
+        drops = iter(drops)
+        while True:
+            rows = [
+                (drop.get('drop_id') or str(uuid.uuid4()), drop['user_id'], drop['content'],
+                 drop.get('emotional_intensity'), drop.get('plk_resonance'), drop.get('created_at') or utc_timestamp())
+                for drop in itertools.islice(drops, batch_size)
+            ]
+            if not rows:
+                return written
+            with self.pool.connection() as conn:
+                conn.executemany("""
+                    INSERT INTO bucket_drops (drop_id, user_id, content, emotional_intensity, plk_resonance, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (drop_id) DO UPDATE SET
+                        user_id = excluded.user_id, content = excluded.content,
+                        emotional_intensity = excluded.emotional_intensity, plk_resonance = excluded.plk_resonance,
+                        created_at = excluded.created_at
+                """, rows)
+            written += len(rows)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def get_drops(self, user_id: str, limit: int = 20, cursor: Optional[DropCursor] = None
+                  ) -> Tuple[List[Dict[str, Any]], Optional[DropCursor]]:
+        """One page of a user's bucket drops, newest first, paged by keyset like get_session_history"""
+        sql = """
+            SELECT drop_id, content, emotional_intensity, plk_resonance, created_at
+            FROM bucket_drops WHERE user_id = ?
+        """
+        params: List[Any] = [user_id]
+        if cursor is not None:
+            sql += " AND (created_at, drop_id) < (?, ?)"
+            params.extend(cursor)
+        sql += " ORDER BY created_at DESC, drop_id DESC LIMIT ?"
+        params.append(limit)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        page = [dict(zip(("drop_id", "content", "emotional_intensity", "plk_resonance", "created_at"), row))
+                for row in rows]
+        next_cursor = (rows[-1][4], rows[-1][0]) if len(rows) == limit else None
+        return page, next_cursor
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def ingest_profiles(self, profiles: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """Insert or replace whole consciousness profiles in batched transactions; returns the number written.
+
+        Each profile needs profile_id and user_id; plk_data, tapestry_nodes and musical_dna are
+        stored as JSON. Use patch_profiles to change part of an existing profile.
+        """
+        written = 0
+        profiles = iter(profiles)
+        while True:
+            rows = [
+                (profile['profile_id'], profile['user_id'],
+                 *(json.dumps(profile[column]) if profile.get(column) is not None else None
+                   for column in PROFILE_JSON_COLUMNS),
+                 utc_timestamp())
+                for profile in itertools.islice(profiles, batch_size)
+            ]
+            if not rows:
+                return written
+            with self.pool.connection() as conn:
+                conn.executemany("""
+                    INSERT INTO consciousness_profiles (profile_id, user_id, plk_data, tapestry_nodes, musical_dna,
+                                                        updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (profile_id) DO UPDATE SET
+                        user_id = excluded.user_id, plk_data = excluded.plk_data,
+                        tapestry_nodes = excluded.tapestry_nodes, musical_dna = excluded.musical_dna,
+                        updated_at = excluded.updated_at
+                """, rows)
+            written += len(rows)
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def patch_profiles(self, patches: Iterable[Tuple[str, Dict[str, Any]]], batch_size: int = 1000) -> int:
+        """Apply JSON merge patches (RFC 7396) to profiles in place; returns the number of profiles changed.
+
+        patches yields (profile_id, {column: patch}) for columns in PROFILE_JSON_COLUMNS. Inside
+        SQLite, each patch's keys overwrite the stored ones, a null value deletes a key, and keys
+        it doesn't mention are kept, so only the changes cross from Python. Arrays are replaced whole.
+        """
+        changed = 0
+        patches = iter(patches)
+        while True:
+            rows = []
+            for profile_id, patch in itertools.islice(patches, batch_size):
+                unknown = set(patch) - set(PROFILE_JSON_COLUMNS)
+                if unknown:
+                    raise ValueError(f"Unknown profile columns: {', '.join(sorted(unknown))}")
+                rows.append((*(json.dumps(patch[column]) if column in patch else None
+                               for column in PROFILE_JSON_COLUMNS),
+                             utc_timestamp(), profile_id))
+            if not rows:
+                return changed
+            with self.pool.connection() as conn:
+                changed += conn.executemany("""
+                    UPDATE consciousness_profiles SET
+                        plk_data = CASE WHEN ?1 IS NULL THEN plk_data ELSE json_patch(COALESCE(plk_data, '{}'), ?1) END,
+                        tapestry_nodes = CASE WHEN ?2 IS NULL THEN tapestry_nodes
+                                              ELSE json_patch(COALESCE(tapestry_nodes, '{}'), ?2) END,
+                        musical_dna = CASE WHEN ?3 IS NULL THEN musical_dna
+                                           ELSE json_patch(COALESCE(musical_dna, '{}'), ?3) END,
+                        updated_at = ?4
+                    WHERE profile_id = ?5
+                """, rows).rowcount
+
+    def patch_profile(self, profile_id: str, **patch: Any) -> bool:
+        """Merge-patch one profile's JSON columns, e.g. patch_profile(pid, musical_dna={"tempo": 120})"""
+        return self.patch_profiles([(profile_id, patch)]) == 1
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """A consciousness profile with its JSON columns decoded, or None"""
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT profile_id, user_id, plk_data, tapestry_nodes, musical_dna, updated_at "
+                "FROM consciousness_profiles WHERE profile_id = ?", (profile_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        profile = dict(zip(("profile_id", "user_id", *PROFILE_JSON_COLUMNS, "updated_at"), row))
+        for column in PROFILE_JSON_COLUMNS:
+            profile[column] = json.loads(profile[column]) if profile[column] is not None else None
+        return profile
+
+    @timed(DB_LATENCY, DB_ERRORS)
+    def search_history(self, user_id: str, query: str, limit: int = 20, order: str = "recent",
+                       sources: Sequence[str] = ("bucket_drops", "tribunal_sessions")) -> List[Dict[str, Any]]:
+        """Full-text search of a user's bucket drops and tribunal queries.
+
+        Every word of query must match (a trailing * matches prefixes). With order="recent" the
+        matches with the newest created_at come first, read through the per-user created_at index
+        so no match is scored. order="relevance" ranks by bm25, which scores every match first and
+        can take hundreds of milliseconds for words common in a large history.
+        Results are dicts with source, id, text, created_at and rank (bm25, lower is better; None
+        when ordering by recency).
+        """
+        expression = match_expression(query)
+        if not expression:
+            return []
+        unknown = set(sources) - set(FULL_TEXT_SOURCES)
+        if unknown:
+            raise ValueError(f"Unknown search sources: {', '.join(sorted(unknown))}")
+        if order not in ("recent", "relevance"):
+            raise ValueError(f"Unknown search order: {order}")
+
+        id_columns = {"bucket_drops": "drop_id", "tribunal_sessions": "session_id"}
+        rows = []
+        with self.pool.connection() as conn:
+            for source in sources:
+                column, id_column = FULL_TEXT_SOURCES[source], id_columns[source]
+                match = f"user_key : {user_key(user_id)} AND {column} : ({expression})"
+                if order == "relevance":
+                    rows += conn.execute(f"""
+                        SELECT '{source}', t.{id_column}, t.{column}, t.created_at, f.rank
+                        FROM {source}_fts AS f JOIN {source} AS t ON t.rowid = f.rowid
+                        WHERE {source}_fts MATCH ? ORDER BY f.rank LIMIT ?
+                    """, (match, limit)).fetchall()
+                else:
+                    # Walk the (user_id, created_at) index newest first, keeping rows the index matched
+                    rows += conn.execute(f"""
+                        SELECT '{source}', {id_column}, {column}, created_at, NULL
+                        FROM {source}
+                        WHERE user_id = ? AND rowid IN (SELECT rowid FROM {source}_fts WHERE {source}_fts MATCH ?)
+                        ORDER BY created_at DESC, {id_column} DESC LIMIT ?
+                    """, (user_id, match, limit)).fetchall()
+
+        if order == "relevance":
+            rows.sort(key=lambda row: row[4])
+        else:
+            rows.sort(key=lambda row: (row[3] or "", row[1]), reverse=True)
+        return [dict(zip(("source", "id", "text", "created_at", "rank"), row)) for row in rows[:limit]]
+
+    def close(self):
+        """Close the pooled connections"""
+        self.pool.close()
@@ -0,0 +1,223 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge(Counter):
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are interpolated within the bucket they fall in"""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.last = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+            self.last = value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class MetricFamily:
+    """A named metric with one child per distinct label set"""
+
+    def __init__(self, name: str, help: str, kind: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.buckets = buckets
+        self._children: Dict[Labels, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: str):
+        key = tuple(sorted((name, str(value)) for name, value in labels.items()))
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = (Histogram(self.buckets) if self.kind == "histogram"
+                             else Gauge() if self.kind == "gauge" else Counter())
+                    self._children[key] = child
+        return child
+
+    def children(self) -> List[Tuple[Dict[str, str], object]]:
+        with self._lock:
+            return [(dict(key), child) for key, child in self._children.items()]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str], **extra: str) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in items.items()) + "}"
+
+
+class MetricsRegistry:
+    """Process-wide collection of metric families, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.families: Dict[str, MetricFamily] = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name: str, help: str, kind: str, buckets: Sequence[float]) -> MetricFamily:
+        with self._lock:
+            if name not in self.families:
+                self.families[name] = MetricFamily(name, help, kind, buckets)
+            return self.families[name]
+
+    def counter(self, name: str, help: str) -> MetricFamily:
+        return self._family(name, help, "counter", ())
+
+    def gauge(self, name: str, help: str) -> MetricFamily:
+        return self._family(name, help, "gauge", ())
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> MetricFamily:
+        return self._family(name, help, "histogram", buckets)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for family in list(self.families.values()):
+            lines.append(f"# HELP {family.name} {family.help}")
+            lines.append(f"# TYPE {family.name} {family.kind}")
+            for labels, child in family.children():
+                if isinstance(child, Histogram):
+                    cumulative = 0
+                    for bound, count in zip([*child.buckets, "+Inf"], child.counts):
+                        cumulative += count
+                        lines.append(f"{family.name}_bucket{_format_labels(labels, le=str(bound))} {cumulative}")
+                    lines.append(f"{family.name}_sum{_format_labels(labels)} {child.sum}")
+                    lines.append(f"{family.name}_count{_format_labels(labels)} {child.count}")
+                else:
+                    lines.append(f"{family.name}{_format_labels(labels)} {child.value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+PERSONA_LATENCY = REGISTRY.histogram(
+    "gestaltview_persona_latency_seconds", "Time to a persona's complete answer, by outcome")
+PERSONA_TTFT = REGISTRY.histogram(
+    "gestaltview_persona_ttft_seconds", "Time to a streaming persona's first text delta")
+PERSONA_TOKENS = REGISTRY.counter(
+    "gestaltview_persona_tokens_total", "Prompt and completion tokens billed by provider calls")
+PERSONA_ERRORS = REGISTRY.counter(
+    "gestaltview_persona_errors_total", "Persona answers replaced by the unavailable notice")
+TRIBUNAL_LATENCY = REGISTRY.histogram(
+    "gestaltview_tribunal_seconds", "Wall time of a whole tribunal")
+DB_LATENCY = REGISTRY.histogram(
+    "gestaltview_db_seconds", "Time spent in GestaltViewDB methods", FAST_BUCKETS)
+DB_ERRORS = REGISTRY.counter(
+    "gestaltview_db_errors_total", "GestaltViewDB calls that raised")
+WRITE_BEHIND_DROPPED = REGISTRY.counter(
+    "gestaltview_write_behind_dropped_total", "Queued saves discarded because SQLite rejected them, by error")
+CIRCUIT_STATE = REGISTRY.gauge(
+    "gestaltview_provider_circuit_state", "1 for the state each provider's circuit breaker is in, 0 for the others")
+GUARD_EVENTS = REGISTRY.counter(
+    "gestaltview_provider_guard_events_total", "Provider guard calls, retries, failures, rejections and breaker openings")
+RERUN_LATENCY = REGISTRY.histogram(
+    "gestaltview_rerun_seconds", "Duration of a Streamlit script run", FAST_BUCKETS + (10.0, 30.0, 90.0))
+
+
+def timed(latency: MetricFamily, errors: Optional[MetricFamily] = None) -> Callable:
+    """Decorator recording a function's duration (and failures) labelled with its name"""
+    def decorate(fn: Callable) -> Callable:
+        histogram = latency.labels(method=fn.__name__)
+        failures = errors.labels(method=fn.__name__) if errors is not None else None
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if failures is not None:
+                    failures.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def serve(port: int, registry: MetricsRegistry = REGISTRY, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Expose the registry at http://host:port/metrics from a daemon thread"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -0,0 +1,165 @@
+"""Deterministic offline providers for benchmarks, load tests and running the app without API keys.
+
+Set ``GESTALTVIEW_PROVIDERS=mock`` to make ``default_providers()`` return these instead of the
+real SDK adapters. Every call's latency, failure and answer are drawn from a generator seeded
+with the provider, the prompt and how many times that prompt has been sent, so a run gives the
+same results however the event loop interleaves the calls.
+"""
+import asyncio
+import math
+import os
+import random
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Union
+
+from providers import Completion, ProviderAdapter, Usage
+
+# Words mock answers are drawn from; a shared, prompt-seeded share of them makes personas partly agree
+VOCABULARY = ("momentum pattern chaos current jazz genius milestone structure rhythm focus energy project "
+              "plan story scar code feature growth truth signal noise frequency habit team market future "
+              "evidence ethics wisdom emotion tapestry weave mirror architect").split()
+
+
+@dataclass
+class LatencyProfile:
+    """Per-call latency: fixed, uniform (median ± spread) or lognormal (spread is sigma), plus a straggler tail"""
+    median: float = 0.5
+    distribution: str = "lognormal"
+    spread: float = 0.3
+    tail_rate: float = 0.0
+    tail_factor: float = 10.0
+    first_token: float = 0.2  # share of the latency before a stream's first delta
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "fixed":
+            latency = self.median
+        elif self.distribution == "uniform":
+            latency = rng.uniform(self.median * (1 - self.spread), self.median * (1 + self.spread))
+        elif self.distribution == "lognormal":
+            latency = rng.lognormvariate(math.log(self.median), self.spread)
+        else:
+            raise ValueError(f"unknown latency distribution {self.distribution!r}")
+        if self.tail_rate and rng.random() < self.tail_rate:
+            latency *= self.tail_factor
+        return max(0.0, latency)
+
+
+@dataclass
+class _MockResponse:
+    status_code: int
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class MockProviderError(Exception):
+    """HTTP-style provider error, shaped like the SDK errors resilience.py classifies"""
+
+    def __init__(self, provider: str, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"{provider} returned HTTP {status_code}")
+        self.status_code = status_code
+        self.response = _MockResponse(status_code, {"retry-after": str(retry_after)} if retry_after else {})
+
+
+@dataclass
+class FailureProfile:
+    """Share of calls that fail, how they fail, and how far into the call the failure arrives.
+
+    kind is "connection" (ConnectionError), "rate_limit" (429 with Retry-After), "server" (503)
+    or "bad_request" (400, not retried).
+    """
+    rate: float = 0.0
+    kind: str = "server"
+    after: float = 0.5  # share of the sampled latency spent before failing
+    retry_after: float = 1.0
+
+    def error(self, provider: str) -> Exception:
+        if self.kind == "connection":
+            return ConnectionError(f"{provider} connection reset")
+        if self.kind == "rate_limit":
+            return MockProviderError(provider, 429, self.retry_after)
+        if self.kind == "bad_request":
+            return MockProviderError(provider, 400)
+        return MockProviderError(provider, 503)
+
+
+class MockProvider(ProviderAdapter):
+    """Provider that answers from seeded distributions instead of the network"""
+
+    def __init__(self, name: str, latency: Optional[LatencyProfile] = None, failures: Optional[FailureProfile] = None,
+                 seed: int = 0, max_concurrency: int = 8, answer_words: int = 60, agreement: float = 0.6):
+        self.name = name
+        self.model = f"mock-{name}"
+        self.latency = latency or LatencyProfile()
+        self.failures = failures or FailureProfile()
+        self.seed = seed
+        self.max_concurrency = max_concurrency
+        self.answer_words = answer_words
+        self.agreement = agreement
+        self.calls = 0
+        self.failed = 0
+        self._sent: Dict[str, int] = {}
+
+    def _draw(self, system_prompt: str, prompt: str):
+        key = f"{system_prompt}\n{prompt}"
+        attempt = self._sent.get(key, 0)
+        self._sent[key] = attempt + 1
+        self.calls += 1
+        rng = random.Random(f"{self.seed}:{self.name}:{key}:{attempt}")
+        latency = self.latency.sample(rng)
+        failed = rng.random() < self.failures.rate
+        return rng, latency, failed
+
+    def _answer(self, rng: random.Random, prompt: str) -> str:
+        shared = random.Random(f"{self.seed}:{prompt}")
+        words = [shared.choice(VOCABULARY) if rng.random() < self.agreement else rng.choice(VOCABULARY)
+                 for _ in range(self.answer_words)]
+        return f"{self.name.capitalize()} reflects: " + " ".join(words) + "."
+
+    async def _fail(self, latency: float):
+        self.failed += 1
+        await asyncio.sleep(latency * self.failures.after)
+        raise self.failures.error(self.name)
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        rng, latency, failed = self._draw(system_prompt, prompt)
+        if failed:
+            await self._fail(latency)
+        await asyncio.sleep(latency)
+        text = self._answer(rng, prompt)
+        return Completion(text, prompt_tokens=(len(system_prompt) + len(prompt)) // 4,
+                          completion_tokens=len(text) // 4)
+
+    async def stream(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> AsyncIterator[Union[str, Usage]]:
+        rng, latency, failed = self._draw(system_prompt, prompt)
+        if failed:
+            await self._fail(latency)
+        text = self._answer(rng, prompt)
+        words = text.split(" ")
+        await asyncio.sleep(latency * self.latency.first_token)
+        gap = latency * (1 - self.latency.first_token) / max(1, len(words) - 1)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(gap)
+            yield word if i == 0 else f" {word}"
+        yield Usage((len(system_prompt) + len(prompt)) // 4, len(text) // 4)
+
+
+# Median latency per provider in seconds, roughly what the real APIs take for a 200-token answer
+MOCK_LATENCIES = {"openai": 1.2, "anthropic": 1.5, "gemini": 1.0, "perplexity": 1.3}
+
+
+def mock_providers(seed: int = 0, scale: float = 1.0, distribution: str = "lognormal", spread: float = 0.3,
+                   tail_rate: float = 0.0, failure_rate: float = 0.0, failure_kind: str = "server",
+                   max_concurrency: int = 8) -> Dict[str, MockProvider]:
+    """One mock per real provider; scale multiplies every median latency (0.01 for fast benchmarks)"""
+    return {
+        name: MockProvider(name, LatencyProfile(median * scale, distribution, spread, tail_rate),
+                           FailureProfile(failure_rate, failure_kind), seed=seed, max_concurrency=max_concurrency)
+        for name, median in MOCK_LATENCIES.items()
+    }
+
+
+def mock_providers_from_env() -> Dict[str, MockProvider]:
+    """Mocks configured by GESTALTVIEW_MOCK_SEED, GESTALTVIEW_MOCK_SCALE and GESTALTVIEW_MOCK_FAILURE_RATE"""
+    return mock_providers(seed=int(os.getenv("GESTALTVIEW_MOCK_SEED", "0")),
+                          scale=float(os.getenv("GESTALTVIEW_MOCK_SCALE", "1.0")),
+                          failure_rate=float(os.getenv("GESTALTVIEW_MOCK_FAILURE_RATE", "0.0")))
@@ -0,0 +1,439 @@
+import asyncio
+import importlib
+import importlib.util
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Type, Union
+import os
+
+from dotenv import load_dotenv
+
+# Provider SDKs are imported on first use (see import_sdk); together they take seconds to import
+# and tens of MB per process, most of which a worker serving a few providers never needs.
+SDK_IMPORT_SECONDS: Dict[str, float] = {}
+
+# An AsyncClient of http_library(); typed loosely so annotating it needs no import
+HTTPClient = Any
+
+
+def import_sdk(module: str) -> ModuleType:
+    """Import a provider SDK the first time it is needed, recording how long the import took"""
+    loaded = sys.modules.get(module)
+    if loaded is not None:
+        return loaded
+    start = time.perf_counter()
+    loaded = importlib.import_module(module)
+    SDK_IMPORT_SECONDS.setdefault(module, time.perf_counter() - start)
+    return loaded
+
+
+def http_library() -> ModuleType:
+    """The httpx flavour the installed OpenAI SDK is built on (httpx, or httpx2 in newer releases).
+
+    The shared pool is built from it so the SDKs accept it as their http_client.
+    """
+    openai = import_sdk("openai")
+    return importlib.import_module(openai.DefaultAsyncHttpxClient.__bases__[0].__module__.split(".")[0])
+
+
+@dataclass
+class HTTPPoolConfig:
+    """Connection limits of the shared HTTP pool used by the HTTP-based providers"""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    http2: bool = True
+
+
+def shared_http_client(config: Optional[HTTPPoolConfig] = None) -> HTTPClient:
+    """Keep-alive AsyncClient to share between providers, so each host costs one TLS handshake per connection.
+
+    HTTP/2 is used when the optional h2 package is installed, otherwise HTTP/1.1 keep-alive.
+    Like any AsyncClient it must only be used from one event loop.
+    """
+    config = config or HTTPPoolConfig()
+    http = http_library()
+    return http.AsyncClient(
+        http2=config.http2 and importlib.util.find_spec("h2") is not None,
+        limits=http.Limits(max_connections=config.max_connections,
+                           max_keepalive_connections=config.max_keepalive_connections,
+                           keepalive_expiry=config.keepalive_expiry),
+        timeout=http.Timeout(config.timeout, connect=10.0),
+    )
+
+
+def _shareable(sdk_client_class: type, http_client: Optional[HTTPClient]) -> Optional[HTTPClient]:
+    """The shared client if an SDK is built on the same httpx flavour, otherwise None so it uses its own"""
+    if http_client is not None and isinstance(http_client, sdk_client_class.__bases__[0]):
+        return http_client
+    return None
+
+
+@dataclass
+class Completion:
+    """A provider's answer together with its token usage"""
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+@dataclass
+class Usage:
+    """Token usage of a streamed answer, yielded by ProviderAdapter.stream after the last text delta"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class ProviderAdapter:
+    """Common async interface in front of every AI provider SDK"""
+
+    name: str = ""
+    model: str = ""
+    max_concurrency: int = 4
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        raise NotImplementedError
+
+    async def stream(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> AsyncIterator[Union[str, Usage]]:
+        """Yield the response in text deltas, then its Usage; adapters without a streaming API yield it whole"""
+        completion = await self.complete(system_prompt, prompt, max_tokens)
+        yield completion.text
+        yield Usage(completion.prompt_tokens, completion.completion_tokens)
+
+    def health_check(self) -> bool:
+        """Whether the adapter's client can still be used"""
+        return True
+
+    async def aclose(self):
+        """Close the adapter's client and its connections; the adapter can't be used afterwards"""
+
+
+class OpenAIProvider(ProviderAdapter):
+    name = "openai"
+    model = "gpt-4"
+    max_concurrency = 8
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, http_client: Optional[HTTPClient] = None):
+        openai = import_sdk("openai")
+        # Retries are handled by resilience.ProviderGuard, so the SDK's own are disabled
+        self.client = openai.AsyncOpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'), max_retries=0,
+                                         http_client=_shareable(openai.DefaultAsyncHttpxClient, http_client))
+        self.model = model or self.model
+        self.max_concurrency = max_concurrency or self.max_concurrency
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens
+        )
+        return Completion(
+            response.choices[0].message.content,
+            prompt_tokens=response.usage.prompt_tokens if response.usage else 0,
+            completion_tokens=response.usage.completion_tokens if response.usage else 0
+        )
+
+    def health_check(self) -> bool:
+        return not self.client.is_closed()
+
+    async def aclose(self):
+        await self.client.close()
+
+    async def stream(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> AsyncIterator[Union[str, Usage]]:
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            # The last chunk has no choices, only the usage of the whole answer
+            if chunk.usage:
+                yield Usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+
+
+class AnthropicProvider(ProviderAdapter):
+    name = "anthropic"
+    model = "claude-3-sonnet-20240229"
+    max_concurrency = 8
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, http_client: Optional[HTTPClient] = None):
+        anthropic = import_sdk("anthropic")
+        self.client = anthropic.AsyncAnthropic(api_key=api_key or os.getenv('ANTHROPIC_API_KEY'), max_retries=0,
+                                               http_client=_shareable(anthropic.DefaultAsyncHttpxClient, http_client))
+        self.model = model or self.model
+        self.max_concurrency = max_concurrency or self.max_concurrency
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        response = await self.client.messages.create(
+            model=self.model,
+            max_tokens=max_tokens,
+            system=system_prompt,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return Completion(
+            response.content[0].text,
+            prompt_tokens=response.usage.input_tokens,
+            completion_tokens=response.usage.output_tokens
+        )
+
+    def health_check(self) -> bool:
+        return not self.client.is_closed()
+
+    async def aclose(self):
+        await self.client.close()
+
+    async def stream(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> AsyncIterator[Union[str, Usage]]:
+        async with self.client.messages.stream(
+            model=self.model,
+            max_tokens=max_tokens,
+            system=system_prompt,
+            messages=[{"role": "user", "content": prompt}]
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            message = await stream.get_final_message()
+            yield Usage(message.usage.input_tokens, message.usage.output_tokens)
+
+
+class GeminiProvider(ProviderAdapter):
+    name = "gemini"
+    model = "gemini-pro"
+    max_concurrency = 4
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                 max_concurrency: Optional[int] = None):
+        genai = import_sdk("google.generativeai")
+        genai.configure(api_key=api_key or os.getenv('GEMINI_API_KEY'))
+        self.model = model or self.model
+        self.client = genai.GenerativeModel(self.model)
+        self.max_concurrency = max_concurrency or self.max_concurrency
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        response = await self.client.generate_content_async(
+            f"{system_prompt}\n\n{prompt}",
+            generation_config={"max_output_tokens": max_tokens}
+        )
+        usage = response.usage_metadata
+        return Completion(
+            response.text,
+            prompt_tokens=usage.prompt_token_count if usage else 0,
+            completion_tokens=usage.candidates_token_count if usage else 0
+        )
+
+    async def stream(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> AsyncIterator[Union[str, Usage]]:
+        response = await self.client.generate_content_async(
+            f"{system_prompt}\n\n{prompt}",
+            generation_config={"max_output_tokens": max_tokens},
+            stream=True
+        )
+        usage = None
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+            # Each chunk carries the running totals; the last one covers the whole answer
+            usage = chunk.usage_metadata or usage
+        if usage:
+            yield Usage(usage.prompt_token_count, usage.candidates_token_count)
+
+
+class PerplexityProvider(ProviderAdapter):
+    """Perplexity's OpenAI-compatible chat completions API, called directly over the pooled HTTP client.
+
+    base_url (or PERPLEXITY_BASE_URL) can point at a local mock server.
+    """
+
+    name = "perplexity"
+    model = "sonar"
+    max_concurrency = 4
+
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, http_client: Optional[HTTPClient] = None,
+                 base_url: Optional[str] = None):
+        self.api_key = api_key or os.getenv('PERPLEXITY_API_KEY')
+        self.base_url = (base_url or os.getenv('PERPLEXITY_BASE_URL') or "https://api.perplexity.ai").rstrip("/")
+        self.client = http_client or shared_http_client()
+        self.model = model or self.model
+        self.max_concurrency = max_concurrency or self.max_concurrency
+
+    def _request(self, system_prompt: str, prompt: str, max_tokens: int, stream: bool = False):
+        return self.client.build_request(
+            "POST", f"{self.base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self.api_key}"},
+            json={
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
+                ],
+                "max_tokens": max_tokens,
+                "stream": stream
+            }
+        )
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        response = await self.client.send(self._request(system_prompt, prompt, max_tokens))
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get("usage") or {}
+        return Completion(
+            body["choices"][0]["message"]["content"],
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0)
+        )
+
+    async def stream(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> AsyncIterator[Union[str, Usage]]:
+        response = await self.client.send(self._request(system_prompt, prompt, max_tokens, stream=True), stream=True)
+        try:
+            if response.is_error:
+                await response.aread()
+                response.raise_for_status()
+            # Server-sent events: one "data: {json}" line per chunk, ending with "data: [DONE]"
+            usage = None
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                choices = event.get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+                usage = event.get("usage") or usage
+            if usage:
+                yield Usage(usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
+        finally:
+            await response.aclose()
+
+    def health_check(self) -> bool:
+        return not self.client.is_closed
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class ThreadPoolProvider(ProviderAdapter):
+    """Runs a blocking SDK call on a bounded thread pool so it never stalls the event loop"""
+
+    def __init__(self, name: str, call: Callable[[str, str, int], str], model: str = "",
+                 max_concurrency: int = 4):
+        self.name = name
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.call = call
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"tribunal-{name}")
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(self.executor, self.call, system_prompt, prompt, max_tokens)
+        return Completion(text)
+
+    async def aclose(self):
+        self.executor.shutdown(wait=False)
+
+
+class LazyProvider(ProviderAdapter):
+    """Stands in for an adapter, building it (and importing its SDK) the first time a persona on it is queried.
+
+    The build runs on a worker thread, so a slow SDK import does not stall the event loop every
+    session shares. The adapter class's model and concurrency are known before it is built.
+    """
+
+    def __init__(self, adapter_class: Type[ProviderAdapter], build: Callable[[], ProviderAdapter]):
+        self.name = adapter_class.name
+        self.model = adapter_class.model
+        self.max_concurrency = adapter_class.max_concurrency
+        self.build = build
+        self.build_seconds = 0.0  # including the SDK import, when this was the first adapter to need it
+        self._adapter: Optional[ProviderAdapter] = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._adapter is not None
+
+    def adapter(self) -> ProviderAdapter:
+        if self._adapter is None:
+            with self._lock:
+                if self._adapter is None:
+                    start = time.perf_counter()
+                    self._adapter = self.build()
+                    self.build_seconds = time.perf_counter() - start
+        return self._adapter
+
+    async def _ready(self) -> ProviderAdapter:
+        if self._adapter is None:
+            await asyncio.to_thread(self.adapter)
+        return self._adapter
+
+    async def complete(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> Completion:
+        adapter = await self._ready()
+        return await adapter.complete(system_prompt, prompt, max_tokens)
+
+    async def stream(self, system_prompt: str, prompt: str, max_tokens: int = 200) -> AsyncIterator[Union[str, Usage]]:
+        adapter = await self._ready()
+        async for delta in adapter.stream(system_prompt, prompt, max_tokens):
+            yield delta
+
+    def health_check(self) -> bool:
+        return self._adapter is None or self._adapter.health_check()
+
+    async def aclose(self):
+        if self._adapter is not None:
+            await self._adapter.aclose()
+
+
+def default_providers(pool: Optional[HTTPPoolConfig] = None) -> Dict[str, ProviderAdapter]:
+    """Adapters for every configured provider, each built on first use.
+
+    The HTTP-based providers share one connection pool, created with the first of them; Gemini's
+    SDK talks gRPC and keeps its own. With GESTALTVIEW_PROVIDERS=mock, deterministic offline mocks
+    are returned instead.
+    """
+    load_dotenv()
+    if os.getenv("GESTALTVIEW_PROVIDERS") == "mock":
+        from mock_providers import mock_providers_from_env
+        return mock_providers_from_env()
+
+    shared = []
+    lock = threading.Lock()
+
+    def http_client() -> HTTPClient:
+        with lock:
+            if not shared:
+                shared.append(shared_http_client(pool))
+            return shared[0]
+
+    return {
+        "openai": LazyProvider(OpenAIProvider, lambda: OpenAIProvider(http_client=http_client())),
+        "anthropic": LazyProvider(AnthropicProvider, lambda: AnthropicProvider(http_client=http_client())),
+        "gemini": LazyProvider(GeminiProvider, GeminiProvider),
+        "perplexity": LazyProvider(PerplexityProvider, lambda: PerplexityProvider(http_client=http_client())),
+    }
@@ -0,0 +1,263 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from metrics import CIRCUIT_STATE, GUARD_EVENTS
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and overloaded or failing servers
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+
+# Requests per second and burst size per provider
+DEFAULT_RATE_LIMITS = {
+    "openai": (8.0, 16),
+    "anthropic": (5.0, 10),
+    "gemini": (5.0, 10),
+    "perplexity": (5.0, 10),
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} is unavailable (circuit open, retrying in {retry_in:.0f}s)")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status of an SDK error, whichever provider SDK raised it"""
+    for attr in ("status_code", "code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether an error is transient: rate limits, server errors, timeouts and dropped connections"""
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    # Transport errors by name, so neither httpx nor the SDKs have to be imported here
+    name = type(exc).__name__
+    return any(part in name for part in ("Timeout", "Connect", "Unavailable", "RemoteProtocol", "ReadError"))
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, from a Retry-After header"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Async token bucket; callers that find it empty reserve a token and sleep until it refills"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    def delay(self, attempt: int, exc: Optional[BaseException] = None) -> float:
+        """Full-jitter exponential backoff, stretched to honour Retry-After when the provider sends one"""
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(exc) if exc is not None else None
+        return min(self.max_delay, max(backoff, requested or 0.0))
+
+
+class CircuitBreaker:
+    """Opens after consecutive transient failures, then lets one probe through after reset_timeout"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    @property
+    def retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def is_open(self) -> bool:
+        """Whether calls are currently being refused, without claiming the half-open probe"""
+        if self.state == self.OPEN:
+            return self.retry_in > 0
+        return self.state == self.HALF_OPEN and self._probing
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and self.retry_in <= 0:
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self):
+        """Give the half-open probe back when a call ends without a verdict (e.g. it was cancelled)"""
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+
+@dataclass
+class GuardStats:
+    calls: int = 0
+    retries: int = 0
+    failures: int = 0
+    rejected: int = 0
+    opened: int = 0
+
+
+class ProviderGuard:
+    """Rate limit, retry and circuit breaker in front of one provider. Use from a single event loop."""
+
+    def __init__(self, provider: str, rate: float = 5.0, burst: int = 10,
+                 retry: Optional[RetryPolicy] = None, breaker: Optional[CircuitBreaker] = None,
+                 timeout: Optional[float] = None):
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst)
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout  # per attempt, or per chunk when streaming
+        self.stats = GuardStats()
+        self._export_state()
+
+    def _count(self, event: str):
+        setattr(self.stats, event, getattr(self.stats, event) + 1)
+        GUARD_EVENTS.labels(provider=self.provider, event=event).inc()
+
+    def _export_state(self):
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            CIRCUIT_STATE.labels(provider=self.provider, state=state).set(1 if self.breaker.state == state else 0)
+
+    def _admit(self):
+        allowed = self.breaker.allow()
+        self._export_state()
+        if not allowed:
+            self._count("rejected")
+            raise CircuitOpenError(self.provider, self.breaker.retry_in)
+        self._count("calls")
+
+    def _succeeded(self):
+        self.breaker.record_success()
+        self._export_state()
+
+    def _released(self):
+        self.breaker.release_probe()
+        self._export_state()
+
+    def _failed(self, exc: Exception):
+        self._count("failures")
+        # Only transient provider trouble counts against the breaker; a bad request is our fault
+        if is_retryable(exc):
+            was_open = self.breaker.state == CircuitBreaker.OPEN
+            self.breaker.record_failure()
+            if not was_open and self.breaker.state == CircuitBreaker.OPEN:
+                self._count("opened")
+        else:
+            self.breaker.record_success()
+        self._export_state()
+
+    async def _bounded(self, awaitable: Awaitable[Any]) -> Any:
+        # A hung provider fails the attempt with asyncio.TimeoutError, which counts against the breaker
+        if self.timeout is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, self.timeout)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Call fn with rate limiting, retrying transient errors with jittered backoff"""
+        for attempt in range(self.retry.max_attempts):
+            self._admit()
+            await self.bucket.acquire()
+            try:
+                result = await self._bounded(fn())
+            except asyncio.CancelledError:
+                self._released()
+                raise
+            except Exception as e:
+                self._failed(e)
+                if not is_retryable(e) or attempt == self.retry.max_attempts - 1:
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self.retry.delay(attempt, e))
+            else:
+                self._succeeded()
+                return result
+
+    async def stream(self, source: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """Iterate source() under the guard; only failures before the first chunk are retried"""
+        for attempt in range(self.retry.max_attempts):
+            self._admit()
+            await self.bucket.acquire()
+            started = False
+            try:
+                chunks = source().__aiter__()
+                while True:
+                    try:
+                        chunk = await self._bounded(chunks.__anext__())
+                    except StopAsyncIteration:
+                        break
+                    started = True
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                self._released()
+                raise
+            except Exception as e:
+                self._failed(e)
+                if started or not is_retryable(e) or attempt == self.retry.max_attempts - 1:
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self.retry.delay(attempt, e))
+            else:
+                self._succeeded()
+                return
+
+
+def default_guards() -> Dict[str, ProviderGuard]:
+    return {provider: ProviderGuard(provider, rate, burst) for provider, (rate, burst) in DEFAULT_RATE_LIMITS.items()}
@@ -0,0 +1,160 @@
+import asyncio
+import atexit
+import os
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict
+
+import streamlit as st
+
+from cache import MemoryCache, ResponseCache, SQLiteCache
+from database import GestaltViewDB
+from metrics import serve
+from runner import get_background_loop
+from tribunal import TribunalService
+from writebehind import WriteBehindQueue
+
+# A persona call still running after this many seconds gets a second, hedged request
+HEDGE_AFTER = 12.0
+
+# Whether history reads include tribunals the write-behind queue has not committed yet
+WRITE_BEHIND_READ_THROUGH = True
+
+
+@dataclass
+class ResourceStats:
+    """Construction cost of a cached resource and how often reruns reused it"""
+    name: str
+    builds: int = 0
+    requests: int = 0
+    build_seconds: float = 0.0
+    build_bytes: int = 0
+    build_blocks: int = 0
+
+    @property
+    def hits(self) -> int:
+        return self.requests - self.builds
+
+    @property
+    def saved_seconds(self) -> float:
+        return self.hits * self.build_seconds
+
+    @property
+    def saved_blocks(self) -> int:
+        return self.hits * self.build_blocks
+
+
+_stats: Dict[str, ResourceStats] = {
+    "database": ResourceStats("database"),
+    "tribunal": ResourceStats("tribunal"),
+}
+
+# Instances currently held by the caches, so invalidation can close them without building new ones
+_live: Dict[str, Any] = {}
+
+
+def _measured_build(name: str, build: Callable[[], Any]) -> Any:
+    """Build a resource while recording its wall time and memory allocations.
+
+    The wall time includes tracemalloc overhead, so it overstates the real build cost.
+    """
+    stats = _stats[name]
+    already_tracing = tracemalloc.is_tracing()
+    if not already_tracing:
+        tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    try:
+        resource = build()
+    finally:
+        elapsed = time.perf_counter() - start
+        after = tracemalloc.take_snapshot()
+        if not already_tracing:
+            tracemalloc.stop()
+
+    diff = after.compare_to(before, "filename")
+    stats.builds += 1
+    stats.build_seconds = elapsed
+    stats.build_bytes = sum(stat.size_diff for stat in diff if stat.size_diff > 0)
+    stats.build_blocks = sum(stat.count_diff for stat in diff if stat.count_diff > 0)
+    return resource
+
+
+@st.cache_resource(show_spinner=False, validate=lambda db: db.health_check())
+def _cached_database() -> GestaltViewDB:
+    db = _live["database"] = _measured_build("database", GestaltViewDB)
+    return db
+
+
+@st.cache_resource(show_spinner=False, validate=lambda tribunal: tribunal.health_check())
+def _cached_tribunal() -> TribunalService:
+    cache = ResponseCache([MemoryCache(), SQLiteCache(_cached_database())])
+    tribunal = _live["tribunal"] = _measured_build("tribunal",
+                                                   lambda: TribunalService(cache=cache, hedge_after=HEDGE_AFTER))
+    return tribunal
+
+
+@st.cache_resource(show_spinner=False, validate=lambda writes: writes.db is _cached_database())
+def _cached_write_queue() -> WriteBehindQueue:
+    writes = WriteBehindQueue(_cached_database(), read_through=WRITE_BEHIND_READ_THROUGH)
+    # Commit whatever is still queued when the server shuts down
+    atexit.register(writes.close)
+    _live["writes"] = writes
+    return writes
+
+
+def get_database() -> GestaltViewDB:
+    """Process-wide GestaltViewDB, initialised once instead of on every rerun"""
+    _stats["database"].requests += 1
+    return _cached_database()
+
+
+def get_tribunal_service() -> TribunalService:
+    """Process-wide TribunalService, keeping personas and provider connection pools across reruns"""
+    _stats["tribunal"].requests += 1
+    return _cached_tribunal()
+
+
+def get_write_queue() -> WriteBehindQueue:
+    """Process-wide write-behind queue in front of the cached GestaltViewDB"""
+    return _cached_write_queue()
+
+
+async def _retire(tribunal: TribunalService):
+    # Calls already in flight on the old service finish (or time out) before its pools are closed
+    await asyncio.sleep(tribunal.flights.timeout or tribunal.persona_timeout)
+    await tribunal.aclose()
+
+
+def invalidate_resources():
+    """Drop the cached resources so the next rerun rebuilds them, committing queued writes first.
+
+    This is process-wide: every session moves to the new resources, and the old provider
+    clients are closed on the background loop once their in-flight calls have had time to end.
+    """
+    writes = _live.pop("writes", None)
+    db = _live.pop("database", None)
+    tribunal = _live.pop("tribunal", None)
+    # Clear before closing, so a concurrent rerun builds fresh resources instead of getting closed ones
+    _cached_write_queue.clear()
+    _cached_tribunal.clear()
+    _cached_database.clear()
+    if writes is not None:
+        writes.close()
+        atexit.unregister(writes.close)
+    if db is not None:
+        db.close()
+    if tribunal is not None:
+        get_background_loop().submit(_retire(tribunal))
+
+
+@st.cache_resource(show_spinner=False)
+def start_metrics_server():
+    """Serve Prometheus metrics on GESTALTVIEW_METRICS_PORT, once per process, when the variable is set"""
+    port = os.getenv("GESTALTVIEW_METRICS_PORT")
+    return serve(int(port)) if port else None
+
+
+def resource_stats() -> Dict[str, ResourceStats]:
+    return _stats
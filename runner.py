@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import queue
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+
+
+class BackgroundLoop:
+    """A single asyncio event loop running in a daemon thread for the whole process.
+
+    Streamlit executes every rerun of every session on its own script thread, so
+    submitting coroutines here lets all sessions share one loop (and the provider
+    clients bound to it) instead of creating a loop per request.
+    """
+
+    def __init__(self, name: str = "tribunal-loop"):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the loop and return a thread-safe future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block only the calling thread until it finishes"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator, timeout: Optional[float] = None) -> Iterator[Any]:
+        """Drive an async generator on the loop and yield its items in the calling thread.
+
+        ``timeout`` bounds the wait for each item, not the whole iteration.
+        """
+        items: queue.Queue = queue.Queue()
+        finished = object()
+
+        async def drain():
+            try:
+                async for item in agen:
+                    items.put(item)
+            finally:
+                items.put(finished)
+
+        future = self.submit(drain())
+        try:
+            while True:
+                item = items.get(timeout=timeout)
+                if item is finished:
+                    break
+                yield item
+            # Surface any exception raised inside the generator
+            future.result()
+        except queue.Empty:
+            raise FutureTimeoutError() from None
+        finally:
+            future.cancel()
+
+    def is_running(self) -> bool:
+        return self.thread.is_alive() and self.loop.is_running()
+
+
+_background_loop: Optional[BackgroundLoop] = None
+_background_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Return the process-wide background loop, starting it on first use"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None or not _background_loop.thread.is_alive():
+            _background_loop = BackgroundLoop()
+        return _background_loop
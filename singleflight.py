@@ -0,0 +1,127 @@
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+@dataclass
+class FlightStats:
+    """How often a key reached the provider and how many callers piggybacked on those calls"""
+    label: str = ""
+    calls: int = 0
+    coalesced: int = 0
+
+
+class _Broadcast:
+    """Replays a single async stream to any number of subscribers, including late joiners"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+    async def _pump(self, source: AsyncIterator[Any]):
+        async for chunk in source:
+            async with self.changed:
+                self.chunks.append(chunk)
+                self.changed.notify_all()
+
+    async def publish(self, source: AsyncIterator[Any], timeout: Optional[float] = None):
+        try:
+            await asyncio.wait_for(self._pump(source), timeout)
+        except BaseException as e:
+            self.error = e
+        finally:
+            async with self.changed:
+                self.done = True
+                self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: position < len(self.chunks) or self.done)
+                pending = self.chunks[position:]
+                finished = self.done
+            for chunk in pending:
+                yield chunk
+            position += len(pending)
+            if finished and position >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """Coalesce concurrent identical requests into one in-flight call.
+
+    The shared call runs as its own task, so a caller that times out or is cancelled
+    does not cancel it for the others. With a timeout, that task fails with asyncio.TimeoutError
+    once it has run that long, so a hung call can't hold its key forever. Must be used from a
+    single event loop.
+    """
+
+    def __init__(self, max_tracked_keys: int = 1024, timeout: Optional[float] = None):
+        self.max_tracked_keys = max_tracked_keys
+        self.timeout = timeout
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self._stats: "OrderedDict[str, FlightStats]" = OrderedDict()
+
+    def _record(self, key: str, label: str, coalesced: bool):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = FlightStats(label)
+            while len(self._stats) > self.max_tracked_keys:
+                self._stats.popitem(last=False)
+        self._stats.move_to_end(key)
+        if coalesced:
+            stats.coalesced += 1
+        else:
+            stats.calls += 1
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], label: str = "") -> Tuple[Any, bool]:
+        """Await fn() or join the identical call already in flight; returns (result, shared)"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(asyncio.wait_for(fn(), self.timeout))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish_call(key, done))
+        self._record(key, label, shared)
+        return await asyncio.shield(task), shared
+
+    def _finish_call(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception as retrieved even if every caller gave up waiting
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, key: str, source: Callable[[], AsyncIterator[Any]], label: str = "") -> AsyncIterator[Any]:
+        """Iterate source() or subscribe to the identical stream already in flight"""
+        broadcast = self._streams.get(key)
+        self._record(key, label, broadcast is not None)
+        if broadcast is None:
+            broadcast = self._streams[key] = _Broadcast()
+            task = asyncio.ensure_future(broadcast.publish(source(), self.timeout))
+            task.add_done_callback(lambda _: self._finish_stream(key, broadcast))
+        async for chunk in broadcast.subscribe():
+            yield chunk
+
+    def streaming(self, key: str) -> bool:
+        """Whether a stream for key is already in flight, so stream() would subscribe to it"""
+        return key in self._streams
+
+    def _finish_stream(self, key: str, broadcast: _Broadcast):
+        if self._streams.get(key) is broadcast:
+            del self._streams[key]
+
+    def stats(self) -> List[FlightStats]:
+        """Per-key statistics for the most recently used keys"""
+        return list(self._stats.values())
+
+    @property
+    def total_coalesced(self) -> int:
+        return sum(stats.coalesced for stats in self._stats.values())
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import GestaltViewDB  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "gestaltview.db")
+
+
+@pytest.fixture
+def db(db_path):
+    database = GestaltViewDB(db_path, pool_size=2)
+    yield database
+    database.close()
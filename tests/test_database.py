@@ -0,0 +1,168 @@
+import sqlite3
+
+from database import SCHEMA_VERSION, GestaltViewDB, session_row
+
+# tribunal_sessions and bucket_drops as the first release created them, before PRAGMA user_version was set
+BASELINE_SCHEMA = """
+    CREATE TABLE users (
+        user_id TEXT PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE,
+        consciousness_level INTEGER DEFAULT 0,
+        empowerment_score REAL DEFAULT 0.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE tribunal_sessions (
+        session_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        query_text TEXT NOT NULL,
+        openai_response TEXT,
+        anthropic_response TEXT,
+        gemini_response TEXT,
+        perplexity_response TEXT,
+        consensus_score REAL,
+        empowerment_consensus REAL,
+        revolutionary_potential REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+    CREATE TABLE bucket_drops (
+        drop_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        content TEXT NOT NULL,
+        emotional_intensity REAL,
+        plk_resonance REAL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+    CREATE TABLE consciousness_profiles (
+        profile_id TEXT PRIMARY KEY,
+        user_id TEXT,
+        plk_data TEXT,
+        tapestry_nodes TEXT,
+        musical_dna TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users (user_id)
+    );
+"""
+
+
+def create_baseline(path: str):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.execute("""
+            INSERT INTO tribunal_sessions (session_id, user_id, query_text, openai_response, gemini_response,
+                                           consensus_score, created_at)
+            VALUES ('s1', 'u1', 'how do I keep momentum', 'Build a ritual', 'Ask what it enables', 0.7,
+                    '2024-01-01 10:00:00')
+        """)
+        conn.execute("""
+            INSERT INTO tribunal_sessions (session_id, user_id, query_text, created_at)
+            VALUES ('s2', 'u2', 'momentum for someone else', '2024-01-02 10:00:00')
+        """)
+        conn.execute("""
+            INSERT INTO bucket_drops (drop_id, user_id, content, created_at)
+            VALUES ('d1', 'u1', 'lost momentum after lunch', '2024-01-03 10:00:00')
+        """)
+    conn.close()
+
+
+def test_migrates_baseline_database(db_path):
+    create_baseline(db_path)
+    db = GestaltViewDB(db_path, pool_size=1)
+    try:
+        with db.pool.connection() as conn:
+            assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(tribunal_responses)")}
+        assert "outlier_score" in columns
+
+        responses = {row[0]: row for row in db.get_session_responses("s1")}
+        assert set(responses) == {"openai", "gemini"}
+        assert responses["openai"][1:3] == ("openai", "Build a ritual")
+        assert responses["gemini"][2] == "Ask what it enables"
+        assert db.get_session_responses("s2") == []
+
+        # Rows written before the full-text index existed are searchable, and only by their owner
+        hits = db.search_history("u1", "momentum")
+        assert [(hit['source'], hit['id']) for hit in hits] == [("bucket_drops", "d1"), ("tribunal_sessions", "s1")]
+        assert [hit['id'] for hit in db.search_history("u2", "momentum")] == ["s2"]
+    finally:
+        db.close()
+
+
+def test_migration_runs_once(db_path):
+    create_baseline(db_path)
+    GestaltViewDB(db_path, pool_size=1).close()
+    db = GestaltViewDB(db_path, pool_size=1)
+    try:
+        assert len(db.get_session_responses("s1")) == 2
+        assert len(db.search_history("u1", "momentum")) == 2
+    finally:
+        db.close()
+
+
+def test_search_recent_orders_by_created_at(db):
+    # Ingested newest first, so insertion order (and FTS rowid) is the reverse of created_at
+    db.ingest_drops([
+        {'drop_id': f"d{day}", 'user_id': "u1", 'content': f"jazz note {day}", 'created_at': f"2024-01-{day:02d} 09:00:00"}
+        for day in (9, 7, 5, 3, 1)
+    ])
+    db.write_batch(sessions=[
+        session_row("s8", "u1", "jazz session", {}, created_at="2024-01-08 09:00:00"),
+        session_row("s2", "u1", "jazz session", {}, created_at="2024-01-02 09:00:00"),
+    ])
+    db.ingest_drops([{'drop_id': "other", 'user_id': "u2", 'content': "jazz", 'created_at': "2024-01-10 09:00:00"}])
+
+    hits = db.search_history("u1", "jazz")
+    assert [hit['id'] for hit in hits] == ["d9", "s8", "d7", "d5", "d3", "s2", "d1"]
+    assert all(hit['rank'] is None for hit in hits)
+    assert [hit['id'] for hit in db.search_history("u1", "jazz", limit=3)] == ["d9", "s8", "d7"]
+
+    # An upsert moves the drop to its new date and re-indexes its new content
+    db.ingest_drops([{'drop_id': "d1", 'user_id': "u1", 'content': "jazz encore", 'created_at': "2024-01-20 09:00:00"}])
+    assert [hit['id'] for hit in db.search_history("u1", "jazz", limit=2)] == ["d1", "d9"]
+    assert [hit['id'] for hit in db.search_history("u1", "encore")] == ["d1"]
+    assert db.search_history("u1", "note 1") == []
+
+
+def test_search_relevance_and_validation(db):
+    db.ingest_drops([
+        {'drop_id': "weak", 'user_id': "u1", 'content': "focus on everything else entirely today", 'created_at': "2024-01-02"},
+        {'drop_id': "strong", 'user_id': "u1", 'content': "focus focus focus", 'created_at': "2024-01-01"},
+    ])
+    hits = db.search_history("u1", "focus", order="relevance", sources=("bucket_drops",))
+    assert [hit['id'] for hit in hits] == ["strong", "weak"]
+    assert hits[0]['rank'] <= hits[1]['rank']
+    assert [hit['id'] for hit in db.search_history("u1", "foc*")] == ["weak", "strong"]
+    assert db.search_history("u1", '   "" ') == []
+
+    for kwargs in ({'order': "oldest"}, {'sources': ("users",)}):
+        try:
+            db.search_history("u1", "focus", **kwargs)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"search_history accepted {kwargs}")
+
+
+def test_session_history_pages_newest_first(db):
+    # Two sessions share a timestamp, so session_id breaks the tie
+    created = ["2024-01-03", "2024-01-01", "2024-01-02", "2024-01-02", "2024-01-05"]
+    db.write_batch(sessions=[session_row(f"s{i}", "u1", f"query {i}", {'consensus_score': i / 10}, created_at=at)
+                             for i, at in enumerate(created)])
+    db.write_batch(sessions=[session_row("x", "u2", "not mine", {}, created_at="2024-01-04")])
+
+    seen = []
+    page, cursor = db.get_session_history("u1", limit=2)
+    seen += page
+    while cursor is not None:
+        page, cursor = db.get_session_history("u1", limit=2, cursor=cursor)
+        seen += page
+    assert [row['session_id'] for row in seen] == ["s4", "s0", "s3", "s2", "s1"]
+    assert seen[0] == {'session_id': "s4", 'created_at': "2024-01-05", 'query_text': "query 4", 'consensus_score': 0.4}
+
+    page, cursor = db.get_session_history("u1", limit=5, columns=("session_id",))
+    assert page == [{'session_id': s} for s in ("s4", "s0", "s3", "s2", "s1")]
+    assert cursor == ("2024-01-01", "s1")
+    assert db.get_session_history("u1", limit=5, cursor=cursor) == ([], None)
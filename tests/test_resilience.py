@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+from metrics import CIRCUIT_STATE, GUARD_EVENTS
+from resilience import CircuitBreaker, CircuitOpenError, ProviderGuard, RetryPolicy
+
+
+def make_guard(provider: str, **kwargs) -> ProviderGuard:
+    return ProviderGuard(provider, rate=1000.0, burst=1000, retry=RetryPolicy(max_attempts=1),
+                         breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05), **kwargs)
+
+
+def exported_state(provider: str) -> str:
+    states = [state for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN)
+              if CIRCUIT_STATE.labels(provider=provider, state=state).value == 1]
+    assert len(states) == 1
+    return states[0]
+
+
+async def fail():
+    raise ConnectionError("connection reset")
+
+
+def test_breaker_opens_then_half_opens_then_closes():
+    guard = make_guard("test-breaker")
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await guard.call(fail)
+        assert guard.breaker.state == CircuitBreaker.OPEN
+        assert exported_state("test-breaker") == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await guard.call(fail)
+
+        await asyncio.sleep(0.06)
+        probe_started = asyncio.Event()
+
+        async def probe():
+            probe_started.set()
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        probe_task = asyncio.ensure_future(guard.call(probe))
+        await probe_started.wait()
+        assert guard.breaker.state == CircuitBreaker.HALF_OPEN
+        assert exported_state("test-breaker") == CircuitBreaker.HALF_OPEN
+        # Only the probe gets through while the provider is on trial
+        with pytest.raises(CircuitOpenError):
+            await guard.call(probe)
+        assert await probe_task == "ok"
+
+        assert guard.breaker.state == CircuitBreaker.CLOSED
+        assert exported_state("test-breaker") == CircuitBreaker.CLOSED
+        assert await guard.call(probe) == "ok"
+
+    asyncio.run(scenario())
+    assert (guard.stats.calls, guard.stats.failures, guard.stats.rejected, guard.stats.opened) == (4, 2, 2, 1)
+    assert GUARD_EVENTS.labels(provider="test-breaker", event="opened").value == 1
+    assert GUARD_EVENTS.labels(provider="test-breaker", event="rejected").value == 2
+
+
+def test_failed_probe_reopens():
+    guard = make_guard("test-reopen")
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await guard.call(fail)
+        await asyncio.sleep(0.06)
+        with pytest.raises(ConnectionError):
+            await guard.call(fail)
+        assert guard.breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            await guard.call(fail)
+
+    asyncio.run(scenario())
+    assert guard.stats.opened == 2
+
+
+def test_cancelled_probe_is_released():
+    guard = make_guard("test-cancel")
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                await guard.call(fail)
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(guard.call(lambda: asyncio.sleep(10)))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert await guard.call(lambda: asyncio.sleep(0, "ok")) == "ok"
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_hung_attempt_times_out_and_counts_against_breaker():
+    guard = make_guard("test-timeout", timeout=0.02)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(asyncio.TimeoutError):
+                await guard.call(lambda: asyncio.sleep(10))
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.OPEN
+
+
+def test_bad_request_does_not_open_breaker():
+    guard = make_guard("test-bad-request")
+
+    async def bad_request():
+        raise ValueError("invalid prompt")
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(ValueError):
+                await guard.call(bad_request)
+
+    asyncio.run(scenario())
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.stats.failures == 3
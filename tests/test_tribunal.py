@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+from cache import MemoryCache, ResponseCache
+from mock_providers import LatencyProfile, MockProvider
+from providers import Usage
+from resilience import CircuitBreaker
+from tribunal import UNAVAILABLE_NOTICE, PersonaResponse, TribunalService
+
+SELECTED = ["architect", "mirror", "philosopher"]
+
+
+def make_service() -> TribunalService:
+    # The philosopher's provider answers well after the tribunal deadline
+    providers = {
+        "openai": MockProvider("openai", LatencyProfile(0.01, "fixed")),
+        "anthropic": MockProvider("anthropic", LatencyProfile(0.01, "fixed")),
+        "gemini": MockProvider("gemini", LatencyProfile(0.3, "fixed")),
+    }
+    return TribunalService(providers, persona_timeout=5.0, cache=ResponseCache([MemoryCache()]), deadline=0.1)
+
+
+def test_deadline_then_complete_pending_joins_running_call():
+    service = make_service()
+
+    async def scenario():
+        start = time.perf_counter()
+        tribunal = await service.summon_tribunal(SELECTED, "where is my focus")
+        assert time.perf_counter() - start < 0.25
+        assert tribunal['pending'] == ["philosopher"]
+        assert set(tribunal['responses']) == {"architect", "mirror"}
+        pending = [result for result in tribunal['results'] if result.pending]
+        assert [(result.persona_id, result.text) for result in pending] == [("philosopher", None)]
+
+        # Still running when the next deadline passes, then collected with a longer one
+        again = await service.complete_pending(tribunal, "where is my focus")
+        assert again['pending'] == ["philosopher"]
+        completed = await service.complete_pending(again, "where is my focus", deadline=1.0)
+        assert completed['pending'] == []
+        philosopher = next(result for result in completed['results'] if result.persona_id == "philosopher")
+        assert philosopher.text.startswith("Gemini reflects:")
+        assert not philosopher.error
+        assert completed['responses']['architect'] == tribunal['responses']['architect']
+        return completed
+
+    completed = asyncio.run(scenario())
+    assert len(completed['results']) == 3
+    # The straggler was joined, not asked a second time
+    assert service.providers["gemini"].calls == 1
+
+
+def test_complete_pending_after_answer_is_cached():
+    service = make_service()
+
+    async def scenario():
+        tribunal = await service.summon_tribunal(SELECTED, "where is my focus")
+        await asyncio.sleep(0.3)
+        return await service.complete_pending(tribunal, "where is my focus")
+
+    completed = asyncio.run(scenario())
+    philosopher = next(result for result in completed['results'] if result.persona_id == "philosopher")
+    assert philosopher.cached
+    assert service.providers["gemini"].calls == 1
+
+
+def test_complete_pending_resolves_persona_whose_circuit_opened():
+    service = make_service()
+
+    async def scenario():
+        tribunal = await service.summon_tribunal(SELECTED, "where is my focus")
+        breaker = service.guards["gemini"].breaker
+        breaker.state, breaker.opened_at = CircuitBreaker.OPEN, time.monotonic()
+        return await service.complete_pending(tribunal, "where is my focus")
+
+    completed = asyncio.run(scenario())
+    philosopher = next(result for result in completed['results'] if result.persona_id == "philosopher")
+    assert philosopher.error and not philosopher.pending
+    assert philosopher.text.startswith(UNAVAILABLE_NOTICE)
+    assert completed['pending'] == []
+    assert completed['skipped'] == ["The Philosopher"]
+
+
+def test_stream_deadline_marks_stragglers_pending():
+    service = make_service()
+
+    async def scenario():
+        texts = {persona_id: "" for persona_id in SELECTED}
+        usage, pending = {}, {}
+        async for persona_id, delta in service.stream_tribunal(SELECTED, "where is my focus"):
+            if isinstance(delta, Usage):
+                usage[persona_id] = delta
+            elif isinstance(delta, PersonaResponse):
+                pending[persona_id] = delta
+            else:
+                texts[persona_id] += delta
+        assert list(pending) == ["philosopher"]
+        assert pending["philosopher"].pending
+        assert set(usage) == {"architect", "mirror"}
+        assert texts["architect"].startswith("Openai reflects:")
+
+        tribunal = {
+            'results': [PersonaResponse(persona_id, "", texts[persona_id]) for persona_id in ("architect", "mirror")]
+                       + list(pending.values()),
+            'pending': list(pending),
+        }
+        # The provider stream outlives the deadline and caches the full answer
+        await asyncio.sleep(0.3)
+        return await service.complete_pending(tribunal, "where is my focus")
+
+    completed = asyncio.run(scenario())
+    assert completed['pending'] == []
+    philosopher = next(result for result in completed['results'] if result.persona_id == "philosopher")
+    assert philosopher.cached and philosopher.text.startswith("Gemini reflects:")
+    assert service.providers["gemini"].calls == 1
+
+
+def test_identical_queries_share_one_call():
+    service = make_service()
+
+    async def scenario():
+        return await asyncio.gather(*(service.summon_tribunal(["architect"], "same question") for _ in range(3)))
+
+    tribunals = asyncio.run(scenario())
+    assert len({tribunal['responses']['architect'] for tribunal in tribunals}) == 1
+    assert service.providers["openai"].calls == 1
+    assert sorted(tribunal['results'][0].tokens > 0 for tribunal in tribunals) == [False, False, True]
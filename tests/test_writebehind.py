@@ -0,0 +1,86 @@
+import sqlite3
+import time
+
+import pytest
+
+from database import GestaltViewDB
+from metrics import WRITE_BEHIND_DROPPED
+from tribunal import PersonaResponse
+from writebehind import WriteBehindQueue
+
+
+@pytest.fixture
+def queue(db):
+    writes = WriteBehindQueue(db, retry_delay=0.01)
+    yield writes
+    writes.close()
+
+
+def tribunal(score: float):
+    return {'consensus_score': score, 'results': [PersonaResponse("mirror", "anthropic", "Listen first", 12.0, 30)]}
+
+
+def test_failing_save_is_dropped_alone(db, queue):
+    dropped = WRITE_BEHIND_DROPPED.labels(error="IntegrityError").value
+    # Holding the condition keeps the writer waiting, so both saves land in one batch
+    with queue._cond:
+        good = queue.save_tribunal("u1", "what next", tribunal(0.8))
+        bad = queue.create_tribunal_session("u1", None)  # query_text is NOT NULL
+    assert queue.flush(timeout=5)
+
+    assert queue.stats.written == 1
+    assert queue.stats.dropped == 1
+    assert queue.stats.last_error.startswith(bad)
+    assert WRITE_BEHIND_DROPPED.labels(error="IntegrityError").value == dropped + 1
+    page, _ = db.get_session_history("u1")
+    assert [row['session_id'] for row in page] == [good]
+    assert db.get_session_responses(good) == [("mirror", "anthropic", "Listen first", 12.0, 30, None)]
+
+
+def test_read_through_sees_queued_writes(db, queue):
+    first = queue.save_tribunal("u1", "first", tribunal(0.1))
+    assert queue.flush(timeout=5)
+    time.sleep(0.01)  # created_at has millisecond resolution
+    with queue._cond:
+        second = queue.save_tribunal("u1", "second", tribunal(0.2))
+        queue.save_tribunal_response(first, {'consensus_score': 0.9, 'results': []})
+
+        page, cursor = queue.get_session_history("u1", limit=1)
+        assert [row['session_id'] for row in page] == [second]
+        page, cursor = queue.get_session_history("u1", limit=1, cursor=cursor)
+        assert [(row['session_id'], row['consensus_score']) for row in page] == [(first, 0.9)]
+        assert queue.get_session_responses(second)[0][2] == "Listen first"
+        assert [row['consensus_score'] for row in db.get_session_history("u1")[0]] == [0.1]
+    assert queue.flush(timeout=5)
+    assert [row['consensus_score'] for row in db.get_session_history("u1")[0]] == [0.2, 0.9]
+
+
+def test_locked_database_drops_instead_of_waiting(db_path):
+    db = GestaltViewDB(db_path, pool_size=1, busy_timeout=0.01)
+    queue = WriteBehindQueue(db, max_pending=1, retry_delay=0.01, max_retry_delay=0.02, lock_timeout=0.3,
+                             put_timeout=0.05)
+    blocker = sqlite3.connect(db_path)
+    full = WRITE_BEHIND_DROPPED.labels(error="QueueFullError").value
+    try:
+        blocker.execute("BEGIN EXCLUSIVE")
+        queue.save_tribunal("u1", "first", tribunal(0.1))
+        assert queue.flush(timeout=0.1) is False  # the writer holds it, retrying the lock
+        queue.save_tribunal("u1", "second", tribunal(0.2))  # waits in the queue
+
+        start = time.monotonic()
+        queue.save_tribunal("u1", "third", tribunal(0.3))  # no room: dropped after put_timeout
+        assert time.monotonic() - start < 1.0
+        assert queue.stats.dropped == 1
+        assert WRITE_BEHIND_DROPPED.labels(error="QueueFullError").value == full + 1
+
+        assert queue.flush(timeout=5)
+        assert queue.stats.dropped == 3
+        assert queue.stats.retries > 0
+        assert "locked" in queue.stats.last_error
+    finally:
+        blocker.rollback()
+        blocker.close()
+        queue.close()
+
+    assert db.get_session_history("u1") == ([], None)
+    db.close()
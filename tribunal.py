@@ -1,13 +1,17 @@
 import asyncio
-from typing import Dict, List, Any
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Any, Optional, Sequence, Tuple, Union
 from dataclasses import dataclass
-import openai
-import anthropic
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
+from cache import ResponseCache, cache_key
+from consensus import score_tribunal
+from metrics import PERSONA_ERRORS, PERSONA_LATENCY, PERSONA_TOKENS, PERSONA_TTFT, TRIBUNAL_LATENCY
+from providers import ProviderAdapter, Usage, default_providers
+from resilience import ProviderGuard, default_guards
+from singleflight import SingleFlight
+
+# Prefix of the text shown in place of a persona's answer when its provider fails
+UNAVAILABLE_NOTICE = "Consciousness synthesis temporarily unavailable"
 
 @dataclass
 class TribunalPersona:
@@ -20,8 +24,30 @@ class TribunalPersona:
     perspective: str
     locked: bool = False
 
+@dataclass
+class PersonaResponse:
+    persona_id: str
+    provider: str
+    text: Optional[str]
+    latency_ms: float = 0.0
+    tokens: int = 0
+    cached: bool = False
+    error: bool = False
+    # How far this answer stands apart from the rest of the tribunal (see consensus.score_groups)
+    outlier_score: Optional[float] = None
+    # Still being generated when the tribunal deadline passed; see TribunalService.complete_pending
+    pending: bool = False
+
+@dataclass
+class HedgeStats:
+    """How many persona calls were hedged with a second request and how often the hedge won"""
+    sent: int = 0
+    won: int = 0
+
 class TribunalService:
-    def __init__(self):
+    def __init__(self, providers: Optional[Dict[str, ProviderAdapter]] = None, persona_timeout: float = 30.0,
+                 cache: Optional[ResponseCache] = None, guards: Optional[Dict[str, ProviderGuard]] = None,
+                 deadline: Optional[float] = None, hedge_after: Optional[float] = None):
         self.personas = [
             TribunalPersona("architect", "The Architect", "Systems & Logic", "openai", "#3B82F6",
                           "Structural thinking and systematic analysis", "How can we build this systematically?"),
@@ -41,11 +67,49 @@ class TribunalService:
                           "Market awareness and strategic positioning", "How does this fit the landscape?", True),
         ]
 
-        # Initialize AI clients
-        self.openai_client = openai.OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        self.anthropic_client = anthropic.Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
-        genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
-        self.gemini_model = genai.GenerativeModel('gemini-pro')
+        # Initialize AI provider adapters, each with its own concurrency limit
+        self.providers = providers if providers is not None else default_providers()
+        self.persona_timeout = persona_timeout
+        self.cache = cache
+        # Shared calls outlive persona_timeout (and so any deadline) so a late answer still reaches the cache,
+        # and a hung attempt times out in its guard first
+        self.flights = SingleFlight(timeout=persona_timeout * 2)
+        self._limits = {name: asyncio.Semaphore(adapter.max_concurrency)
+                        for name, adapter in self.providers.items()}
+        # Rate limit, retries and circuit breaker per provider
+        self.guards = guards if guards is not None else default_guards()
+        for name in self.providers:
+            self.guards.setdefault(name, ProviderGuard(name))
+        for guard in self.guards.values():
+            if guard.timeout is None:
+                guard.timeout = persona_timeout
+        # Tribunal-wide deadline, and the latency after which a straggling call gets a second request
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.hedge_stats = HedgeStats()
+
+    def health_check(self) -> bool:
+        """Whether every provider adapter is still usable"""
+        return all(adapter.health_check() for adapter in self.providers.values())
+
+    async def aclose(self):
+        """Close every provider's client and connection pool; the service can't be used afterwards"""
+        await asyncio.gather(*(adapter.aclose() for adapter in self.providers.values()), return_exceptions=True)
+
+    def breaker_states(self) -> Dict[str, str]:
+        """Circuit breaker state of every provider"""
+        return {name: guard.breaker.state for name, guard in self.guards.items()}
+
+    def unhealthy_providers(self) -> List[str]:
+        """Providers whose circuit breaker is currently refusing calls"""
+        return [name for name, guard in self.guards.items() if guard.breaker.is_open()]
+
+    def split_personas(self, selected_personas: List[str]) -> Tuple[List[TribunalPersona], List[TribunalPersona]]:
+        """Selected personas as (active, skipped); personas on a provider with an open circuit are skipped"""
+        unhealthy = self.unhealthy_providers()
+        selected = [p for p in self.personas if p.id in selected_personas]
+        return ([p for p in selected if p.provider not in unhealthy],
+                [p for p in selected if p.provider in unhealthy])
 
     def get_available_personas(self, user_tier: str = "basic") -> List[TribunalPersona]:
         """Get personas based on user tier"""
@@ -55,8 +119,8 @@ class TribunalService:
             return self.personas[:6]
         return self.personas[:3]
 
-    async def query_persona(self, persona: TribunalPersona, query: str, context: str = "") -> str:
-        """Query a specific AI persona"""
+    def build_prompts(self, persona: TribunalPersona, query: str, context: str = "") -> Tuple[str, str]:
+        """Build the system prompt and user prompt for a persona"""
         system_prompt = f"""You are {persona.name}, specializing in {persona.specialty}.
         Your perspective: {persona.perspective}
 
@@ -68,60 +132,289 @@ class TribunalService:
 
         Respond with empathy and empowerment in 150 words max."""
 
-        try:
-            if persona.provider == "openai":
-                response = self.openai_client.chat.completions.create(
-                    model="gpt-4",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": f"Context: {context}\n\nQuery: {query}"}
-                    ],
-                    max_tokens=200
-                )
-                return response.choices[0].message.content
-
-            elif persona.provider == "anthropic":
-                response = self.anthropic_client.messages.create(
-                    model="claude-3-sonnet-20240229",
-                    max_tokens=200,
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": f"Context: {context}\n\nQuery: {query}"}]
-                )
-                return response.content[0].text
-
-            elif persona.provider == "gemini":
-                prompt = f"{system_prompt}\n\nContext: {context}\n\nQuery: {query}"
-                response = self.gemini_model.generate_content(prompt)
-                return response.text
+        return system_prompt, f"Context: {context}\n\nQuery: {query}"
+
+    async def query_persona(self, persona: TribunalPersona, query: str, context: str = "") -> str:
+        """Query a specific AI persona"""
+        response = await self.query_persona_response(persona, query, context)
+        return response.text
+
+    async def query_persona_response(self, persona: TribunalPersona, query: str, context: str = "") -> PersonaResponse:
+        """Query a specific AI persona, keeping latency and token usage alongside the text"""
+        system_prompt, prompt = self.build_prompts(persona, query, context)
+
+        adapter = self.providers.get(persona.provider)
+        if adapter is None:
+            return PersonaResponse(persona.id, persona.provider, None)
 
+        start = time.perf_counter()
+        key = cache_key(persona.id, adapter.model, query, context)
+        if self.cache:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                elapsed = time.perf_counter() - start
+                PERSONA_LATENCY.labels(persona=persona.id, provider=persona.provider, outcome="cached").observe(elapsed)
+                return PersonaResponse(persona.id, persona.provider, cached, elapsed * 1000, cached=True)
+
+        async def limited_call():
+            async with self._limits[persona.provider]:
+                return await adapter.complete(system_prompt, prompt, max_tokens=200)
+
+        async def call_provider():
+            completion = await self.hedged(lambda: self.guards[persona.provider].call(limited_call))
+            labels = dict(persona=persona.id, provider=persona.provider, model=adapter.model)
+            PERSONA_TOKENS.labels(kind="prompt", **labels).inc(completion.prompt_tokens)
+            PERSONA_TOKENS.labels(kind="completion", **labels).inc(completion.completion_tokens)
+            # Only real answers are cached, never the unavailable notices below
+            if self.cache and completion.text:
+                await self.cache.aput(key, completion.text)
+            return completion
+
+        tokens = 0
+        error = False
+        outcome = "ok"
+        try:
+            # Identical concurrent queries share one provider call. The timeout covers queueing
+            # behind the provider limit as well as the call itself.
+            completion, shared = await asyncio.wait_for(
+                self.flights.do(key, call_provider, label=f"{persona.id}: {query[:40]}"),
+                timeout=self.persona_timeout
+            )
+            # Tokens are billed once, to the caller that actually reached the provider
+            text, tokens = completion.text, 0 if shared else completion.tokens
+        except asyncio.TimeoutError:
+            text = f"{UNAVAILABLE_NOTICE}: {persona.name} timed out after {self.persona_timeout:.0f}s"
+            error, outcome = True, "timeout"
         except Exception as e:
-            return f"Consciousness synthesis temporarily unavailable: {str(e)}"
+            text = f"{UNAVAILABLE_NOTICE}: {str(e)}"
+            error, outcome = True, "error"
+        elapsed = time.perf_counter() - start
+        PERSONA_LATENCY.labels(persona=persona.id, provider=persona.provider, outcome=outcome).observe(elapsed)
+        if error:
+            PERSONA_ERRORS.labels(persona=persona.id, provider=persona.provider, reason=outcome).inc()
+        return PersonaResponse(persona.id, persona.provider, text, elapsed * 1000, tokens, error=error)
 
-    async def summon_tribunal(self, selected_personas: List[str], query: str, user_context: str = "") -> Dict[str, Any]:
-        """Summon the AI tribunal for consciousness synthesis"""
-        active_personas = [p for p in self.personas if p.id in selected_personas]
+    async def hedged(self, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await call(), sending a second identical request if the first is slower than hedge_after.
 
-        # Query all personas in parallel
-        tasks = []
-        for persona in active_personas:
-            tasks.append(self.query_persona(persona, query, user_context))
+        Whichever request succeeds first wins and the other is cancelled.
+        """
+        if self.hedge_after is None:
+            return await call()
+        first = asyncio.ensure_future(call())
+        running = {first}
+        try:
+            done, _ = await asyncio.wait(running, timeout=self.hedge_after)
+            if done:
+                return first.result()
 
-        responses = await asyncio.gather(*tasks)
+            self.hedge_stats.sent += 1
+            hedge = asyncio.ensure_future(call())
+            running = {first, hedge}
+            error: Optional[BaseException] = None
+            while running:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_stats.won += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Also reached when the caller is cancelled, so no request is left running without an owner
+            for task in running:
+                task.cancel()
 
-        # Create response mapping
-        tribunal_responses = {}
-        for i, persona in enumerate(active_personas):
-            tribunal_responses[persona.provider] = responses[i]
+    async def summon_tribunal(self, selected_personas: List[str], query: str, user_context: str = "",
+                              deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Summon the AI tribunal for consciousness synthesis.
 
-        # Calculate consensus metrics (simplified)
-        consensus_score = min(0.95, 0.7 + len(active_personas) * 0.05)
-        empowerment_score = 0.85 + (len(active_personas) * 0.02)
-        revolutionary_potential = 0.90 if len(active_personas) > 4 else 0.75
+        Personas still answering when the deadline (default self.deadline) passes are returned
+        as pending and listed under 'pending'; complete_pending fills them in later.
+        """
+        # Personas on a provider with an open circuit are dropped instead of failing slowly
+        active_personas, skipped = self.split_personas(selected_personas)
+        deadline = deadline if deadline is not None else self.deadline
+        start = time.perf_counter()
+
+        # Query all personas in parallel
+        tasks = [asyncio.ensure_future(self.query_persona_response(persona, query, user_context))
+                 for persona in active_personas]
+        if tasks:
+            await asyncio.wait(tasks, timeout=deadline)
+
+        results = []
+        for persona, task in zip(active_personas, tasks):
+            if task.done():
+                results.append(task.result())
+            else:
+                # Only this wait is cancelled: the provider call keeps running in its single-flight
+                # task and caches its answer, so complete_pending picks it up instead of re-asking
+                task.cancel()
+                results.append(PersonaResponse(persona.id, persona.provider, None, deadline * 1000, pending=True))
+        TRIBUNAL_LATENCY.labels(mode="summon").observe(time.perf_counter() - start)
 
         return {
-            'responses': tribunal_responses,
+            'responses': {result.persona_id: result.text for result in results if not result.pending},
+            'results': results,
             'personas': [p.name for p in active_personas],
-            'consensus_score': consensus_score,
-            'empowerment_consensus': empowerment_score,
-            'revolutionary_potential': revolutionary_potential
+            'skipped': [p.name for p in skipped],
+            'pending': [result.persona_id for result in results if result.pending],
+            **self.consensus_metrics(active_personas, results)
+        }
+
+    async def complete_pending(self, tribunal: Dict[str, Any], query: str, user_context: str = "",
+                               deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Fill in the pending personas of an earlier summon_tribunal result.
+
+        Stragglers that have finished in the meantime come straight from the response cache;
+        ones still running are joined rather than asked again.
+        """
+        update = await self.summon_tribunal(tribunal.get('pending', []), query, user_context, deadline)
+        filled = {result.persona_id: result for result in update['results']}
+        # A pending persona whose provider circuit has opened since won't answer; resolve it as unavailable
+        for persona in self.personas:
+            if persona.name in update['skipped'] and persona.id in tribunal.get('pending', []):
+                filled[persona.id] = PersonaResponse(
+                    persona.id, persona.provider, f"{UNAVAILABLE_NOTICE}: {persona.name} is paused while its "
+                                                  f"provider recovers", error=True)
+        results = [filled.get(result.persona_id, result) for result in tribunal['results']]
+        active_personas = [p for p in self.personas if p.id in {result.persona_id for result in results}]
+        return {
+            **tribunal,
+            'responses': {result.persona_id: result.text for result in results if not result.pending},
+            'results': results,
+            'skipped': [*tribunal.get('skipped', []), *update['skipped']],
+            'pending': [result.persona_id for result in results if result.pending],
+            **self.consensus_metrics(active_personas, results)
+        }
+
+    async def stream_persona(self, persona: TribunalPersona, query: str,
+                             context: str = "") -> AsyncIterator[Union[str, Usage]]:
+        """Stream a specific AI persona's response as text deltas, then its Usage if it reached the provider"""
+        system_prompt, prompt = self.build_prompts(persona, query, context)
+
+        adapter = self.providers.get(persona.provider)
+        if adapter is None:
+            return
+
+        key = cache_key(persona.id, adapter.model, query, context)
+        if self.cache:
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                yield cached
+                return
+
+        async def limited_stream():
+            async with self._limits[persona.provider]:
+                async for delta in adapter.stream(system_prompt, prompt, max_tokens=200):
+                    yield delta
+
+        async def provider_stream():
+            text = ""
+            async for delta in self.guards[persona.provider].stream(limited_stream):
+                if isinstance(delta, Usage):
+                    labels = dict(persona=persona.id, provider=persona.provider, model=adapter.model)
+                    PERSONA_TOKENS.labels(kind="prompt", **labels).inc(delta.prompt_tokens)
+                    PERSONA_TOKENS.labels(kind="completion", **labels).inc(delta.completion_tokens)
+                else:
+                    text += delta
+                yield delta
+            if self.cache and text:
+                await self.cache.aput(key, text)
+
+        # Identical concurrent queries subscribe to one provider stream; tokens are billed once,
+        # to the caller whose stream reached the provider
+        leader = not self.flights.streaming(key)
+        async for delta in self.flights.stream(key, provider_stream, label=f"{persona.id}: {query[:40]}"):
+            if leader or not isinstance(delta, Usage):
+                yield delta
+
+    async def stream_tribunal(self, selected_personas: List[str], query: str, user_context: str = "",
+                              active_personas: Optional[List[TribunalPersona]] = None,
+                              deadline: Optional[float] = None
+                              ) -> AsyncIterator[Tuple[str, Union[str, Usage, PersonaResponse]]]:
+        """Stream (persona_id, delta) chunks from every selected persona, interleaved as they arrive.
+
+        Deltas are text, except for a Usage with the tokens of each persona whose call reached the provider.
+        When the deadline (default self.deadline) passes, each persona still answering gets a pending
+        PersonaResponse and the stream ends; complete_pending collects those answers later.
+
+        Personas on a provider with an open circuit are skipped. Pass active_personas from
+        split_personas to stream exactly the personas a caller has already laid out.
+        """
+        if active_personas is None:
+            active_personas, _ = self.split_personas(selected_personas)
+        deadline = deadline if deadline is not None else self.deadline
+        chunks: asyncio.Queue = asyncio.Queue()
+        finished = object()
+
+        start = time.perf_counter()
+
+        async def forward(persona: TribunalPersona):
+            first = True
+            async for delta in self.stream_persona(persona, query, user_context):
+                if first and not isinstance(delta, Usage):
+                    PERSONA_TTFT.labels(persona=persona.id, provider=persona.provider).observe(time.perf_counter() - start)
+                    first = False
+                await chunks.put((persona.id, delta))
+
+        async def pump(persona: TribunalPersona):
+            outcome = "cancelled"
+            try:
+                await asyncio.wait_for(forward(persona), timeout=self.persona_timeout)
+                outcome = "ok"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                await chunks.put((persona.id, f"\n\n{UNAVAILABLE_NOTICE}: "
+                                              f"{persona.name} timed out after {self.persona_timeout:.0f}s"))
+            except Exception as e:
+                outcome = "error"
+                await chunks.put((persona.id, f"{UNAVAILABLE_NOTICE}: {str(e)}"))
+            finally:
+                labels = dict(persona=persona.id, provider=persona.provider)
+                PERSONA_LATENCY.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+                if outcome in ("timeout", "error"):
+                    PERSONA_ERRORS.labels(reason=outcome, **labels).inc()
+                await chunks.put((persona.id, finished))
+
+        tasks = [asyncio.create_task(pump(persona)) for persona in active_personas]
+        try:
+            running = {persona.id: persona for persona in active_personas}
+            while running:
+                remaining = None if deadline is None else max(0.0, deadline - (time.perf_counter() - start))
+                try:
+                    persona_id, delta = await asyncio.wait_for(chunks.get(), remaining)
+                except asyncio.TimeoutError:
+                    # Only the forwarding is cancelled: each provider stream keeps running in its
+                    # single-flight task and caches its answer for complete_pending
+                    for persona in running.values():
+                        yield persona.id, PersonaResponse(persona.id, persona.provider, None, deadline * 1000,
+                                                          pending=True)
+                    break
+                if delta is finished:
+                    del running[persona_id]
+                    continue
+                yield persona_id, delta
+            TRIBUNAL_LATENCY.labels(mode="stream").observe(time.perf_counter() - start)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def consensus_metrics(self, active_personas: List[TribunalPersona],
+                          results: Sequence[PersonaResponse] = ()) -> Dict[str, float]:
+        """Calculate consensus metrics, recording each answer's outlier score on its result.
+
+        consensus_score is the mean pairwise similarity of the answers; errors and pending
+        personas are left out. The other two metrics are still simple heuristics.
+        """
+        answered = [result for result in results if result.text and not result.error and not result.pending]
+        consensus = score_tribunal({result.persona_id: result.text for result in answered})
+        for result in answered:
+            result.outlier_score = consensus.outliers[result.persona_id]
+        return {
+            'consensus_score': consensus.consensus_score,
+            'empowerment_consensus': 0.85 + (len(active_personas) * 0.02),
+            'revolutionary_potential': 0.90 if len(active_personas) > 4 else 0.75
         }
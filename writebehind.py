@@ -0,0 +1,239 @@
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from database import (DEFAULT_HISTORY_COLUMNS, GestaltViewDB, HistoryCursor, response_rows, score_row,
+                      session_row)
+from metrics import WRITE_BEHIND_DROPPED
+
+
+def _is_lock_error(exc: sqlite3.OperationalError) -> bool:
+    """Whether SQLite refused the write only because another connection holds a lock"""
+    message = str(exc)
+    return "locked" in message or "busy" in message
+
+
+class QueueFullError(Exception):
+    """A save was dropped because the queue stayed full for put_timeout"""
+
+
+@dataclass
+class PendingWrite:
+    """Rows for one save, flattened when it is queued so later changes to the tribunal can't leak in"""
+    session_id: str
+    user_id: str = ""
+    session: Optional[tuple] = None  # a new tribunal_sessions row, or None for a score update
+    scores: Optional[tuple] = None
+    responses: List[tuple] = field(default_factory=list)
+
+
+@dataclass
+class WriteBehindStats:
+    queued: int = 0
+    written: int = 0
+    batches: int = 0
+    retries: int = 0
+    dropped: int = 0
+    max_depth: int = 0
+    flush_seconds: float = 0.0  # time spent in the most recent batch transaction
+    last_error: str = ""  # why the most recently dropped save was rejected
+
+    @property
+    def mean_batch(self) -> float:
+        return self.written / self.batches if self.batches else 0.0
+
+
+class WriteBehindQueue:
+    """Queues tribunal writes and commits them from a background thread in batched transactions.
+
+    Saving returns as soon as the rows are queued, so the request path never waits on the disk
+    or on SQLite locks held by other sessions. The writer takes everything queued since its last
+    transaction (up to batch_size saves) and commits it at once. Lock errors are retried with
+    backoff for up to lock_timeout seconds; at most max_pending saves are held, and beyond that a
+    saver waits up to put_timeout for room. If SQLite rejects a batch for any other reason, its
+    saves are committed one at a time so only the ones that still fail are lost. Every save given
+    up on, for any of these reasons, is counted in gestaltview_write_behind_dropped_total, so a
+    database locked by another process costs saves, never an unbounded wait on the request path.
+    close() writes everything still queued before returning.
+
+    With read_through, history and response reads merge in the writes that are queued or being
+    committed, so a session sees its own tribunals straight away.
+    """
+
+    def __init__(self, db: GestaltViewDB, max_pending: int = 1000, batch_size: int = 200,
+                 retry_delay: float = 0.05, max_retry_delay: float = 2.0, lock_timeout: float = 30.0,
+                 put_timeout: float = 1.0, read_through: bool = True):
+        self.db = db
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.lock_timeout = lock_timeout
+        self.put_timeout = put_timeout
+        self.read_through = read_through
+        self.stats = WriteBehindStats()
+        self._queued: Deque[PendingWrite] = deque()
+        self._writing: List[PendingWrite] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="gestaltview-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self) -> int:
+        return len(self._queued) + len(self._writing)
+
+    def _put(self, write: PendingWrite):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            if not self._cond.wait_for(lambda: len(self._queued) < self.max_pending, self.put_timeout):
+                self._drop(write, QueueFullError(f"{self.max_pending} saves already queued"))
+                return
+            self._queued.append(write)
+            self.stats.queued += 1
+            self.stats.max_depth = max(self.stats.max_depth, self.depth)
+            self._cond.notify_all()
+
+    def create_tribunal_session(self, user_id: str, query: str) -> str:
+        """Queue a new, empty tribunal session and return its id"""
+        session_id = str(uuid.uuid4())
+        self._put(PendingWrite(session_id, user_id, session=session_row(session_id, user_id, query, {})))
+        return session_id
+
+    def save_tribunal(self, user_id: str, query: str, tribunal: Dict[str, Any]) -> str:
+        """Queue a tribunal session with all of its persona responses and return its id"""
+        session_id = str(uuid.uuid4())
+        self._put(PendingWrite(session_id, user_id, session=session_row(session_id, user_id, query, tribunal),
+                               responses=response_rows(session_id, tribunal.get('results', []))))
+        return session_id
+
+    def save_tribunal_response(self, session_id: str, responses: Dict[str, Any]):
+        """Queue updated scores and responses for an existing session"""
+        self._put(PendingWrite(session_id, scores=score_row(session_id, responses),
+                               responses=response_rows(session_id, responses.get('results', []))))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queued and not self._closed:
+                    self._cond.wait()
+                if not self._queued:
+                    return
+                self._writing = [self._queued.popleft() for _ in range(min(self.batch_size, len(self._queued)))]
+                self._cond.notify_all()
+            self._commit(self._writing)
+            with self._cond:
+                self._writing = []
+                self._cond.notify_all()
+
+    def _write(self, batch: List[PendingWrite]):
+        """Commit batch in one transaction, retrying lock errors for up to lock_timeout"""
+        sessions = [write.session for write in batch if write.session is not None]
+        scores = [write.scores for write in batch if write.scores is not None]
+        responses = [row for write in batch for row in write.responses]
+        attempt = 0
+        give_up = time.monotonic() + self.lock_timeout
+        while True:
+            start = time.perf_counter()
+            try:
+                self.db.write_batch(sessions, scores, responses)
+            except sqlite3.OperationalError as e:
+                if not _is_lock_error(e) or time.monotonic() >= give_up:
+                    raise
+                self.stats.retries += 1
+                time.sleep(min(self.max_retry_delay, self.retry_delay * 2 ** attempt))
+                attempt += 1
+            else:
+                self.stats.flush_seconds = time.perf_counter() - start
+                self.stats.written += len(batch)
+                self.stats.batches += 1
+                return
+
+    def _commit(self, batch: List[PendingWrite]):
+        try:
+            self._write(batch)
+            return
+        except Exception as e:
+            # Still locked after lock_timeout: retrying each save alone would only wait that long again
+            if len(batch) == 1 or (isinstance(e, sqlite3.OperationalError) and _is_lock_error(e)):
+                for write in batch:
+                    self._drop(write, e)
+                return
+        # The transaction rolled back as a whole; retry each save alone so only the bad ones are lost
+        for write in batch:
+            try:
+                self._write([write])
+            except Exception as e:
+                self._drop(write, e)
+
+    def _drop(self, write: PendingWrite, error: Exception):
+        self.stats.dropped += 1
+        self.stats.last_error = f"{write.session_id}: {error}"
+        WRITE_BEHIND_DROPPED.labels(error=type(error).__name__).inc()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until everything queued so far is committed; False if timeout ran out first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queued or self._writing:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: Optional[float] = 30.0) -> bool:
+        """Stop accepting writes and commit everything still queued; False if that took longer than timeout"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def _pending(self) -> List[PendingWrite]:
+        with self._cond:
+            return [*self._writing, *self._queued]
+
+    def get_session_history(self, user_id: str, limit: int = 20, cursor: Optional[HistoryCursor] = None,
+                            columns: Sequence[str] = DEFAULT_HISTORY_COLUMNS
+                            ) -> Tuple[List[Dict[str, Any]], Optional[HistoryCursor]]:
+        """GestaltViewDB.get_session_history, including queued sessions and scores when reading through"""
+        if not self.read_through:
+            return self.db.get_session_history(user_id, limit, cursor, columns)
+
+        # Snapshot the queue before reading, so a write committed in between shows up at least once
+        pending = self._pending()
+        wanted = tuple(dict.fromkeys(("created_at", "session_id", *columns)))
+        rows, _ = self.db.get_session_history(user_id, limit, cursor, wanted)
+        on_disk = {row['session_id'] for row in rows}
+        for write in pending:
+            if write.session is None or write.user_id != user_id or write.session_id in on_disk:
+                continue
+            row = dict(zip(("session_id", "user_id", "query_text", "consensus_score", "empowerment_consensus",
+                            "revolutionary_potential", "created_at"), write.session))
+            if cursor is None or (row['created_at'], row['session_id']) < tuple(cursor):
+                rows.append(row)
+        scores = {write.session_id: write.scores for write in pending if write.scores is not None}
+        for row in rows:
+            if row['session_id'] in scores:
+                row.update(zip(("consensus_score", "empowerment_consensus", "revolutionary_potential"),
+                               scores[row['session_id']][:3]))
+
+        rows.sort(key=lambda row: (row['created_at'], row['session_id']), reverse=True)
+        rows = rows[:limit]
+        next_cursor = (rows[-1]['created_at'], rows[-1]['session_id']) if len(rows) == limit else None
+        return [{column: row[column] for column in columns} for row in rows], next_cursor
+
+    def get_session_responses(self, session_id: str) -> List[tuple]:
+        """GestaltViewDB.get_session_responses, with queued responses replacing stored ones when reading through"""
+        pending = self._pending() if self.read_through else []
+        responses = {row[0]: row for row in self.db.get_session_responses(session_id)}
+        for write in pending:
+            if write.session_id == session_id:
+                responses.update((row[1], row[1:]) for row in write.responses)
+        return list(responses.values())